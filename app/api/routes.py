@@ -1,53 +1,123 @@
 from __future__ import annotations
 
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from cachetools import LRUCache
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from pydantic import BaseModel
 
 from app.core.config import settings
+from app.core.http_cache import etag_matches, make_etag, pick_encoding
+from app.core.load import LoadTracker
+from app.core.serialization import ORJSONResponse, dumps
 
 # IMPORTANT: tooling model must be hardcoded (no env override).
 XAI_MODEL_TOOLING = "grok-4-1-fast-non-reasoning"
 from app.models.schemas import (
-    CanonicalRecipe,
     ContinueRequest,
+    GenerateMultiItem,
+    GenerateMultiRequest,
+    GenerateMultiResponse,
     GenerateRequest,
     GenerateResponse,
     RecipeResponse,
+    SessionState,
 )
+from app.services.catalog import CatalogBundler
 from app.services.generator import RecipeGenerator
-from app.services.translation import TranslationService
+from app.services.popularity import PopularityTracker
+from app.services.prefetch import Prefetcher
+from app.services.scaling import servings_out_of_range
+from app.services.translation import TRANSLATION_VERSION, TranslationService
 from app.storage.recipes import RecipeRepo
 from app.storage.robot_profiles import RobotProfileRepo
+from app.storage.backends import create_backend
 from app.storage.cache import Cache
+from app.storage.idempotency import IdempotencyConflict, IdempotencyInProgress, IdempotencyStore
+from app.storage.sessions import SessionStore
 from app.xai.client import XAIClient
+from app.xai.router import TASK_ADAPT, TASK_EXTRACT, TASK_REPLAN, TASK_TRANSLATE, ModelRouter
+from app.xai.usage import BudgetExceeded, RequestUsage, UsageMeter
 
 
-router = APIRouter(prefix="/v1", tags=["v1"])
+router = APIRouter(prefix="/v1", tags=["v1"], default_response_class=ORJSONResponse)
 
-# MVP state (in-memory)
-cache = Cache(ttl_s=settings.CACHE_TTL_S, maxsize=settings.CACHE_MAXSIZE)
-
-# In-memory sessions (MVP). For prod: Redis/Postgres.
-# session_id -> state
-sessions: dict[str, dict[str, Any]] = {}
+# Shared state: cache + sessions live in one backend (memory by default; sqlite/redis for multi-worker).
+state_backend = create_backend(
+    settings.STATE_BACKEND,
+    maxsize=settings.CACHE_MAXSIZE,
+    sqlite_path=settings.STATE_SQLITE_PATH,
+    redis_url=settings.STATE_REDIS_URL,
+)
+cache = Cache(ttl_s=settings.CACHE_TTL_S, maxsize=settings.CACHE_MAXSIZE, backend=state_backend)
+sessions = SessionStore(state_backend, ttl_s=settings.SESSION_TTL_S)
+idempotency = IdempotencyStore(
+    state_backend,
+    ttl_s=settings.IDEMPOTENCY_TTL_S,
+    pending_ttl_s=settings.IDEMPOTENCY_PENDING_TTL_S,
+    wait_s=settings.IDEMPOTENCY_WAIT_S,
+)
 
 recipe_repo = RecipeRepo(settings.RECIPES_DIR)
 robot_repo = RobotProfileRepo(settings.ROBOT_PROFILES_DIR)
 
 xai = XAIClient(settings.XAI_BASE_URL, settings.XAI_API_KEY, timeout_s=settings.XAI_TIMEOUT_S)
-translator = TranslationService(xai=xai, model=settings.XAI_MODEL_GENERAL, store=settings.XAI_STORE_MESSAGES)
+
+# Candidate models per task and payload size, in preference order (XAI_ROUTES overrides all but extract).
+MODEL_ROUTES: dict[str, dict[str, list[str]]] = {
+    TASK_ADAPT: {
+        "small": [settings.XAI_MODEL_GENERAL, XAI_MODEL_TOOLING],
+        "large": [settings.XAI_MODEL_GENERAL, XAI_MODEL_TOOLING],
+    },
+    TASK_REPLAN: {
+        "small": [XAI_MODEL_TOOLING, settings.XAI_MODEL_GENERAL],
+        "large": [settings.XAI_MODEL_GENERAL, XAI_MODEL_TOOLING],
+    },
+    TASK_TRANSLATE: {
+        "small": [XAI_MODEL_TOOLING, settings.XAI_MODEL_GENERAL],
+        "large": [settings.XAI_MODEL_GENERAL, XAI_MODEL_TOOLING],
+    },
+}
+MODEL_ROUTES.update({task: r for task, r in settings.XAI_ROUTES.items() if task != TASK_EXTRACT})
+MODEL_ROUTES[TASK_EXTRACT] = {"small": [XAI_MODEL_TOOLING], "large": [XAI_MODEL_TOOLING]}
+
+usage_meter = UsageMeter(
+    state=state_backend,
+    prices_per_mtok=settings.XAI_PRICES_PER_MTOK,
+    daily_token_budget=settings.XAI_DAILY_TOKEN_BUDGET,
+    daily_cost_budget_usd=settings.XAI_DAILY_COST_BUDGET_USD,
+    adaptive_output=settings.XAI_ADAPTIVE_OUTPUT_TOKENS,
+)
+model_router = ModelRouter(
+    xai,
+    MODEL_ROUTES,
+    small_payload_chars=settings.XAI_ROUTE_SMALL_PAYLOAD_CHARS,
+    slow_ms=settings.XAI_ROUTE_SLOW_MS,
+    cooldown_s=settings.XAI_ROUTE_COOLDOWN_S,
+    usage=usage_meter,
+)
+translator = TranslationService(router=model_router, store=settings.XAI_STORE_MESSAGES, cache=cache)
 
 generator = RecipeGenerator(
-    xai=xai,
-    model_tooling=XAI_MODEL_TOOLING,
-    model_general=settings.XAI_MODEL_GENERAL,
+    router=model_router,
     translator=translator,
     store=settings.XAI_STORE_MESSAGES,
     allowed_domains=[d.strip() for d in settings.WEB_ALLOWED_DOMAINS.split(",") if d.strip()] or None,
     excluded_domains=[d.strip() for d in settings.WEB_EXCLUDED_DOMAINS.split(",") if d.strip()] or None,
+    cache=cache,
 )
 
+catalog = CatalogBundler(recipe_repo, robot_repo, translator, max_langs=settings.CATALOG_MAX_LANGS)
+catalog_langs = frozenset(x.strip().lower() for x in settings.CATALOG_LANGS.split(",") if x.strip())
+
+# Serialized GET /recipes* bodies: (kind, id, lang) -> (etag, bytes); a changed ETag means rebuild.
+response_cache: LRUCache = LRUCache(maxsize=settings.RESPONSE_CACHE_MAXSIZE)
+
+# Live-traffic load (fed by LoadMiddleware) and generate/catalog-language popularity, for background prefetch.
+load_tracker = LoadTracker()
+popularity = PopularityTracker(half_life_s=settings.POPULARITY_HALF_LIFE_S)
+
 # Mapping rules (MVP; move to DB/config later)
 MAPPING_RULES = {
     "verbs_to_modes": {
@@ -64,104 +134,352 @@ MAPPING_RULES = {
 }
 
 
+prefetcher = Prefetcher(
+    generator=generator,
+    profiles=robot_repo,
+    popularity=popularity,
+    catalog=catalog,
+    load=load_tracker,
+    usage=usage_meter,
+    mapping_rules=MAPPING_RULES,
+    top_n=settings.PREFETCH_TOP_N,
+    top_langs=settings.PREFETCH_TOP_LANGS,
+    min_count=settings.PREFETCH_MIN_COUNT,
+    interval_s=settings.PREFETCH_INTERVAL_S,
+    idle_s=settings.PREFETCH_IDLE_S,
+)
+
+
+IdempotencyKey = Header(default=None, alias="Idempotency-Key", max_length=255)
+
+
+async def _idempotent(
+    scope: str,
+    key: Optional[str],
+    req: BaseModel,
+    compute: Callable[[], Awaitable[BaseModel]],
+) -> ORJSONResponse:
+    """Run `compute` once per Idempotency-Key; duplicates get the stored (or in-flight) response."""
+    if not key:
+        return ORJSONResponse(await compute())
+
+    async def run() -> bytes:
+        return dumps(await compute())
+
+    try:
+        body, replayed = await idempotency.run(scope, key, dumps(req), run)
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="idempotency_key_reused")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="idempotency_key_in_progress")
+    return ORJSONResponse(body, headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+
+@asynccontextmanager
+async def _metered(endpoint: str) -> AsyncIterator[RequestUsage]:
+    """Token accounting for one request; an exhausted daily budget with nothing cached -> 503."""
+    try:
+        async with usage_meter.request(endpoint) as usage:
+            yield usage
+    except BudgetExceeded as e:
+        raise HTTPException(
+            status_code=503, detail="llm_budget_exhausted", headers={"Retry-After": str(e.retry_after_s)}
+        )
+
+
 @router.get("/health")
 async def health() -> dict[str, str]:
     return {"status": "ok", "service": settings.APP_NAME}
 
 
+@router.get("/ready")
+async def ready(request: Request) -> ORJSONResponse:
+    """Readiness: 503 until startup warmup is done (use as the deploy health check)."""
+    startup = request.app.state.startup
+    return ORJSONResponse(
+        {"status": "ready" if startup.ready else "starting", "startup": startup.snapshot()},
+        status_code=200 if startup.ready else 503,
+    )
+
+
+@router.get("/metrics")
+async def metrics() -> dict[str, Any]:
+    return {
+        "model_router": model_router.snapshot(),
+        "usage": usage_meter.snapshot(),
+        "popularity": {
+            "top": [{"request": req, "count": round(n, 2)} for req, n in popularity.top(settings.PREFETCH_TOP_N)],
+            "top_langs": [
+                {"lang": lang, "count": round(n, 2)} for lang, n in popularity.top_langs(settings.PREFETCH_TOP_LANGS)
+            ],
+            "prefetch": {"enabled": settings.PREFETCH_ENABLED, **prefetcher.stats},
+        },
+    }
+
+
+def _observe_lang(lang: str) -> None:
+    # Only supported catalog languages are worth prefetching.
+    if not catalog_langs or lang.lower() in catalog_langs:
+        popularity.observe_lang(lang)
+
+
+def _cacheable_headers(etag: str) -> dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={settings.RECIPE_CACHE_MAX_AGE_S}, "
+            f"stale-while-revalidate={settings.RECIPE_CACHE_STALE_S}"
+        ),
+    }
+
+
 @router.get("/recipes")
-async def list_recipes(lang: str = Query(default="ru")) -> dict[str, Any]:
-    # MVP: list meta only; localization for titles can be added later.
-    return {"items": recipe_repo.list_meta(), "lang": lang}
+async def list_recipes(request: Request, lang: str = Query(default="ru")) -> Response:
+    etag = make_etag("list", recipe_repo.content_hashes(), lang)
+    headers = _cacheable_headers(etag)
+    if etag_matches(request.headers.get("if-none-match"), [etag]):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(("list", "", lang))
+    if cached is None or cached[0] != etag:
+        # MVP: list meta only; localization for titles can be added later.
+        cached = (etag, dumps({"items": recipe_repo.list_meta(), "lang": lang}))
+        response_cache[("list", "", lang)] = cached
+    return Response(content=cached[1], media_type="application/json", headers=headers)
 
 
 @router.get("/recipes/{recipe_id}", response_model=RecipeResponse)
-async def get_recipe(recipe_id: str, lang: str = Query(default="ru")) -> RecipeResponse:
-    recipe = recipe_repo.get(recipe_id)
-    if not recipe:
+async def get_recipe(request: Request, recipe_id: str, lang: str = Query(default="ru")) -> Response:
+    """
+    Catalog recipe, localized. ETag = (recipe content hash, lang, translation version), so
+    revalidation (If-None-Match -> 304) needs no translation, and repeat opens are served
+    from the cached serialized body.
+    """
+    content = recipe_repo.content_hash(recipe_id)
+    if content is None:
         raise HTTPException(status_code=404, detail="recipe_not_found")
+    _observe_lang(lang)
+
+    etag = make_etag("recipe", content, lang, TRANSLATION_VERSION)
+    headers = _cacheable_headers(etag)
+    if etag_matches(request.headers.get("if-none-match"), [etag]):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(("recipe", recipe_id, lang))
+    if cached is None or cached[0] != etag:
+        recipe = recipe_repo.get(recipe_id)
+        if not recipe:
+            raise HTTPException(status_code=404, detail="recipe_not_found")
+        async with _metered("recipe"):
+            localized = await translator.localize(recipe, lang)
+        # Same shape as RecipeResponse; canonical_recipe is embedded from the repo's pre-serialized bytes.
+        cached = (etag, dumps({
+            "recipe_id": recipe_id,
+            "lang": lang,
+            "origin": "internal",
+            "canonical_recipe": recipe_repo.get_fragment(recipe_id),
+            "localized": localized,
+            "robot_program": [],
+            "manual_steps": [],
+            "warnings": [],
+            "questions": [],
+            "source_urls": [],
+        }))
+        response_cache[("recipe", recipe_id, lang)] = cached
+    return Response(content=cached[1], media_type="application/json", headers=headers)
+
+
+@router.get("/catalog/bundle")
+async def catalog_bundle(
+    request: Request,
+    lang: str = Query(default="ru", min_length=2, max_length=10),
+    since: Optional[str] = Query(default=None, max_length=64),
+) -> Response:
+    """
+    Offline sync: all catalog recipes localized for `lang` + robot programs per profile.
 
-    localized = await translator.localize(recipe, lang)
-    return RecipeResponse(
-        recipe_id=recipe_id,
-        lang=lang,
-        origin="internal",
-        canonical_recipe=recipe,
-        localized=localized,
-        robot_program=[],
-        manual_steps=[],
-        warnings=[],
-        questions=[],
-        source_urls=[],
-    )
+    `since=<version>` returns only items changed since that version (+ removed ids) when the
+    version is still known, otherwise a full bundle. Bodies are prebuilt and precompressed
+    (gzip, br if available); ETag/If-None-Match make an unchanged sync a 304.
+    """
+    lang = lang.lower()
+    if catalog_langs and lang not in catalog_langs:
+        raise HTTPException(status_code=422, detail="unsupported_lang")
+    popularity.observe_lang(lang)
+    if not lang.lower().startswith("ru") and not settings.XAI_API_KEY:
+        raise HTTPException(status_code=500, detail="XAI_API_KEY_not_configured")
+
+    async with _metered("catalog_bundle"):
+        bundle = await catalog.bundle(lang, since)
+    encoding = pick_encoding(request.headers.get("accept-encoding"), bundle.variants)
+    headers = {
+        "ETag": bundle.etag(encoding),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "X-Catalog-Version": bundle.version,
+    }
+    if etag_matches(request.headers.get("if-none-match"), bundle.etags()):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=bundle.variants[encoding], media_type="application/json", headers=headers)
 
 
 @router.post("/recipes/generate", response_model=GenerateResponse)
-async def generate_recipe(req: GenerateRequest) -> GenerateResponse:
+async def generate_recipe(
+    req: GenerateRequest, idempotency_key: Optional[str] = IdempotencyKey
+) -> ORJSONResponse:
     """
     Initial call:
       - extracts canonical recipe via web_search tool
       - adapts to robot profile
       - if questions remain -> returns session_id + questions[]
       - else returns session_id + full result
+    Retries with the same Idempotency-Key return the first result instead of re-running the pipeline.
     """
+    return await _idempotent("generate", idempotency_key, req, lambda: _generate(req))
+
+
+async def _generate(req: GenerateRequest) -> GenerateResponse:
     if not settings.XAI_API_KEY:
         raise HTTPException(status_code=500, detail="XAI_API_KEY_not_configured")
 
     profile = robot_repo.get(req.robot_model)
     if not profile:
         raise HTTPException(status_code=404, detail="robot_profile_not_found")
+    popularity.observe(req)
 
-    session_id, result, questions, canonical, plan = await generator.generate_from_web(req, profile, MAPPING_RULES)
+    async with _metered("generate") as usage:
+        session_id, result, questions, canonical, plan, localized = await generator.generate_from_web(
+            req, profile, MAPPING_RULES
+        )
 
     # Store session state for /continue
-    sessions[session_id] = {
-        "req": req.model_dump(),
-        "robot_model": req.robot_model,
-        "canonical_recipe": canonical.model_dump(),
-        "answers": {},  # accumulated
-        "last_questions": questions,
-    }
+    await sessions.save(session_id, SessionState(
+        req=req,
+        canonical_recipe=canonical,
+        answers={},  # accumulated
+        last_questions=questions,
+        plan=plan,
+        localized=localized,
+    ))
+
+    return GenerateResponse(session_id=session_id, result=result, questions=questions, usage=usage.summary())
+
 
-    return GenerateResponse(session_id=session_id, result=result, questions=questions)
+@router.post("/recipes/generate/multi", response_model=GenerateMultiResponse)
+async def generate_multi(
+    req: GenerateMultiRequest, idempotency_key: Optional[str] = IdempotencyKey
+) -> ORJSONResponse:
+    """
+    Plans for several robot models in one call:
+      - search/extract/localize once
+      - full adaptation for the first robot_model
+      - deterministic retargeting for the rest (LLM only for unmappable steps)
+    Each item gets its own session_id for /continue.
+    """
+    return await _idempotent("generate_multi", idempotency_key, req, lambda: _generate_multi(req))
+
+
+async def _generate_multi(req: GenerateMultiRequest) -> GenerateMultiResponse:
+    if not settings.XAI_API_KEY:
+        raise HTTPException(status_code=500, detail="XAI_API_KEY_not_configured")
+
+    robot_models = list(dict.fromkeys(req.robot_models))
+    profiles = [robot_repo.get(m) for m in robot_models]
+    if not all(profiles):
+        raise HTTPException(status_code=404, detail="robot_profile_not_found")
+    # Only the first robot is adapted by the LLM (the rest are retargeted), so only it is worth prefetching.
+    popularity.observe(GenerateRequest(
+        query=req.query, lang=req.lang, robot_model=robot_models[0], constraints=req.constraints
+    ))
+
+    async with _metered("generate_multi") as usage:
+        canonical, localized, outcomes = await generator.generate_multi(
+            req, profiles, MAPPING_RULES  # type: ignore[arg-type]
+        )
+
+    items: list[GenerateMultiItem] = []
+    for robot_model, (session_id, result, questions, plan) in zip(robot_models, outcomes):
+        await sessions.save(session_id, SessionState(
+            req=GenerateRequest(query=req.query, lang=req.lang, robot_model=robot_model, constraints=req.constraints),
+            canonical_recipe=canonical,
+            answers={},
+            last_questions=questions,
+            plan=plan,
+            localized=localized,
+        ))
+        items.append(GenerateMultiItem(
+            robot_model=robot_model, session_id=session_id, result=result, questions=questions
+        ))
+
+    return GenerateMultiResponse(items=items, usage=usage.summary())
 
 
 @router.post("/recipes/generate/continue", response_model=GenerateResponse)
-async def generate_continue(req: ContinueRequest) -> GenerateResponse:
+async def generate_continue(
+    req: ContinueRequest, idempotency_key: Optional[str] = IdempotencyKey
+) -> ORJSONResponse:
     """
     Continue call:
       - merges answers into session
-      - reruns adapt+validate (+localize) using stored canonical recipe
+      - servings-only answers: rescales stored recipe + plan locally (no LLM)
+      - otherwise reruns adapt+validate (+localize) using stored canonical recipe
       - returns questions[] if still missing data, or full result if resolved
     """
-    state = sessions.get(req.session_id)
+    return await _idempotent("continue", idempotency_key, req, lambda: _continue(req))
+
+
+async def _continue(req: ContinueRequest) -> GenerateResponse:
+    state = await sessions.get(req.session_id)
     if not state:
         raise HTTPException(status_code=404, detail="session_not_found")
 
     if not settings.XAI_API_KEY:
         raise HTTPException(status_code=500, detail="XAI_API_KEY_not_configured")
 
-    stored_req = GenerateRequest.model_validate(state["req"])
+    stored_req = state.req
     profile = robot_repo.get(stored_req.robot_model)
     if not profile:
         raise HTTPException(status_code=404, detail="robot_profile_not_found")
 
+    if servings_out_of_range(req.answers or {}):
+        raise HTTPException(status_code=422, detail="servings_out_of_range")
+
     # Merge answers (accumulate)
-    merged_answers: dict[str, Any] = dict(state.get("answers", {}))
+    merged_answers: dict[str, Any] = dict(state.answers)
     merged_answers.update(req.answers or {})
-    state["answers"] = merged_answers
-
-    canonical = CanonicalRecipe.model_validate(state["canonical_recipe"])
-
-    result, questions, plan = await generator.resume_adaptation(
-        session_id=req.session_id,
-        canonical=canonical,
-        profile=profile,
-        mapping_rules=MAPPING_RULES,
-        req=stored_req,
-        answers=merged_answers,
-    )
-
-    state["last_questions"] = questions
-
-    return GenerateResponse(session_id=req.session_id, result=result, questions=questions)
+    state.answers = merged_answers
+
+    canonical = state.canonical_recipe
+
+    async with _metered("continue") as usage:
+        rescaled = None
+        if state.plan is not None and state.localized is not None:
+            rescaled = await generator.rescale_servings(
+                session_id=req.session_id,
+                canonical=canonical,
+                plan=state.plan,
+                localized=state.localized,
+                profile=profile,
+                req=stored_req,
+                new_answers=req.answers or {},
+            )
+        if rescaled is not None:
+            result, questions, plan, localized, state.canonical_recipe = rescaled
+        else:
+            result, questions, plan, localized = await generator.resume_adaptation(
+                session_id=req.session_id,
+                canonical=canonical,
+                profile=profile,
+                mapping_rules=MAPPING_RULES,
+                req=stored_req,
+                answers=merged_answers,
+            )
+
+    state.last_questions = questions
+    state.plan = plan
+    state.localized = localized
+    await sessions.save(req.session_id, state)
+
+    return GenerateResponse(session_id=req.session_id, result=result, questions=questions, usage=usage.summary())
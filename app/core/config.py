@@ -25,6 +25,22 @@ class Settings(BaseSettings):
     XAI_MODEL_GENERAL: str = "grok-4-1-fast-reasoning"
     XAI_TIMEOUT_S: float = 60.0
 
+    # Model routing for adapt/replan/translate (extraction always uses the tooling model).
+    # XAI_ROUTES is JSON: {"translate": {"small": ["model-a", "model-b"], "large": [...]}, ...}
+    XAI_ROUTES: dict[str, dict[str, list[str]]] = {}
+    XAI_ROUTE_SMALL_PAYLOAD_CHARS: int = 6000
+    XAI_ROUTE_SLOW_MS: float = 30_000.0  # rolling p50 above this marks a model degraded
+    XAI_ROUTE_COOLDOWN_S: float = 30.0  # after 3 consecutive failures
+
+    # Token/cost accounting (GET /v1/metrics). Prices are JSON: {"model": [input_usd_per_1M, output_usd_per_1M]}
+    XAI_PRICES_PER_MTOK: dict[str, list[float]] = {}
+    # max_output_tokens from the rolling p95 of recent outputs per stage/model (+30%), capped at the code defaults
+    XAI_ADAPTIVE_OUTPUT_TOKENS: bool = True
+    # Daily caps (UTC day), 0 = off; when spent, generate/translate serve cached results only.
+    # Counted in the state backend: shared by all workers with sqlite/redis, per process with memory.
+    XAI_DAILY_TOKEN_BUDGET: int = 0
+    XAI_DAILY_COST_BUDGET_USD: float = 0.0
+
     # Responses API behavior
     XAI_STORE_MESSAGES: bool = False  # set false to avoid server-side storage
 
@@ -35,7 +51,46 @@ class Settings(BaseSettings):
 
     # Caching (in-memory TTL cache for MVP)
     CACHE_TTL_S: int = 60 * 60 * 24  # 24h
-    CACHE_MAXSIZE: int = 10_000
+    CACHE_MAXSIZE: int = 10_000  # memory/sqlite: bounds cache entries only (sessions/idempotency are TTL-only)
+
+    # Cache + session state backend: memory (single worker) | sqlite (shared by workers on one host) | redis
+    STATE_BACKEND: str = "memory"
+    STATE_SQLITE_PATH: str = "data/state/state.sqlite3"
+    STATE_REDIS_URL: str = "redis://localhost:6379/0"
+    SESSION_TTL_S: int = 60 * 60 * 24  # 24h
+
+    # Idempotency-Key on generate/continue: stored response TTL, claim TTL (crashed worker), cross-worker wait
+    IDEMPOTENCY_TTL_S: int = 60 * 60 * 24  # 24h
+    IDEMPOTENCY_PENDING_TTL_S: int = 600
+    IDEMPOTENCY_WAIT_S: float = 180.0
+
+    # Recipe read endpoints: HTTP caching (clients/CDN) + in-process cache of serialized responses
+    RECIPE_CACHE_MAX_AGE_S: int = 300
+    RECIPE_CACHE_STALE_S: int = 60 * 60 * 24
+    RESPONSE_CACHE_MAXSIZE: int = 2_000
+
+    # Request tracing: Server-Timing header + per-request log line; slow-request span dumps are off when 0
+    TRACING_ENABLED: bool = True
+    TRACE_SLOW_MS: float = 0.0
+    TRACE_SLOW_SAMPLE_RATE: float = 1.0
+
+    # Offline catalog bundles: supported languages (comma-separated, empty = any) and how many stay built
+    CATALOG_LANGS: str = "ru,uk,be,kk,en,de,fr,es,it,pl"
+    CATALOG_MAX_LANGS: int = 16
+
+    # Startup warmup: catalog bundles prebuilt for these languages (comma-separated) before /v1/ready
+    WARMUP_CATALOG_LANGS: str = "ru"
+
+    # Popularity of generate (query, lang, robot_model) combos and of recipe/catalog read languages +
+    # background cache warming for the top N combos and the catalog bundles of the top languages.
+    # Prefetch spends LLM tokens; it runs only after PREFETCH_IDLE_S without live requests and within budget.
+    POPULARITY_HALF_LIFE_S: float = 6 * 3600.0
+    PREFETCH_ENABLED: bool = False
+    PREFETCH_TOP_N: int = 20
+    PREFETCH_TOP_LANGS: int = 3
+    PREFETCH_MIN_COUNT: float = 2.0
+    PREFETCH_INTERVAL_S: float = 60.0
+    PREFETCH_IDLE_S: float = 5.0
 
     # Domain controls for web recipe search (comma-separated)
     WEB_ALLOWED_DOMAINS: str = ""     # e.g. "allrecipes.com,bbcgoodfood.com"
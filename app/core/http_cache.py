@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from typing import Iterable, Optional
+
+import orjson
+
+try:  # optional: `pip install brotli` enables br encoding for prebuilt bundles
+    import brotli
+except ImportError:  # pragma: no cover - depends on optional dependency
+    brotli = None
+
+
+def make_etag(*parts: object) -> str:
+    """Strong ETag from JSON-able parts (content hashes, lang, versions)."""
+    return '"' + hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()[:24] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etags: Iterable[str]) -> bool:
+    """If-None-Match check (RFC 9110 weak comparison: W/ prefixes are ignored)."""
+    if not if_none_match:
+        return False
+    candidates = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    if "*" in candidates:
+        return True
+    return any(e.removeprefix("W/") in candidates for e in etags)
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set[str]:
+    out: set[str] = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        out.add(name.strip().lower())
+    return out
+
+
+def encode_variants(raw: bytes) -> dict[str, bytes]:
+    """Identity + precompressed variants (built once, served as static bytes)."""
+    out = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        out["br"] = brotli.compress(raw, quality=11)
+    return out
+
+
+def pick_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> str:
+    accepted = accepted_encodings(accept_encoding)
+    for enc in ("br", "gzip"):
+        if enc in available and (enc in accepted or "*" in accepted):
+            return enc
+    return "identity"
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import time
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class LoadTracker:
+    """In-flight HTTP requests; background jobs use it to run only while the service is idle."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.last_active = time.monotonic()
+
+    def idle_for(self) -> float:
+        """Seconds since the last live request finished (0 while any is in flight)."""
+        if self.in_flight:
+            return 0.0
+        return time.monotonic() - self.last_active
+
+
+class LoadMiddleware:
+    """Pure ASGI middleware feeding a LoadTracker; probe paths (health checks, metrics) are not traffic."""
+
+    def __init__(self, app: ASGIApp, *, tracker: LoadTracker, ignore_paths: frozenset[str] = frozenset()):
+        self.app = app
+        self.tracker = tracker
+        self.ignore_paths = ignore_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.ignore_paths:
+            await self.app(scope, receive, send)
+            return
+        self.tracker.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.tracker.in_flight -= 1
+            self.tracker.last_active = time.monotonic()
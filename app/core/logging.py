@@ -1,9 +1,22 @@
 import logging
 import sys
+from contextvars import ContextVar
+
+# Set per request by the tracing middleware; "-" outside of requests (startup, background tasks).
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
 
 def setup_logging(level: int = logging.INFO) -> None:
     logging.basicConfig(
         level=level,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        format="%(asctime)s [%(levelname)s] %(name)s [req=%(request_id)s]: %(message)s",
         stream=sys.stdout,
     )
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(RequestIdFilter())
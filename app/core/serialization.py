@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# Non-str dict keys show up in LLM answers (e.g. {1: "yes"}); keep them serializable.
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    # Pydantic models are serialized by pydantic-core directly into JSON bytes and
+    # embedded as-is, so no intermediate dict is ever built.
+    if isinstance(obj, BaseModel):
+        return orjson.Fragment(obj.__pydantic_serializer__.to_json(obj))
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+def fragment(model: BaseModel) -> orjson.Fragment:
+    """
+    Pre-serialized JSON for a model.
+
+    Fragments can be cached and embedded into larger payloads without re-encoding.
+    """
+    return orjson.Fragment(model.__pydantic_serializer__.to_json(model))
+
+
+def content_hash(model: BaseModel) -> str:
+    """sha256 of the model's JSON; stable for equal content, used for cache keys and ETags."""
+    return hashlib.sha256(model.__pydantic_serializer__.to_json(model)).hexdigest()
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson.
+
+    Accepts plain JSON-able values, pydantic models, orjson fragments,
+    or already-serialized bytes (returned unchanged).
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
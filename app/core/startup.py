@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger("app.startup")
+
+
+class Startup:
+    """
+    Startup timing and readiness for /v1/ready.
+
+    `t0` is taken at the top of app.main, so `import_ms` covers importing the framework and
+    building the module-level singletons; warmup phases are timed separately. A failing
+    phase is logged and recorded but does not block readiness (the lazy paths still work).
+    """
+
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self.import_ms: Optional[float] = None
+        self.ready_ms: Optional[float] = None
+        self.phases: dict[str, float] = {}
+        self.errors: list[str] = []
+        self.ready = False
+
+    def imported(self) -> None:
+        self.import_ms = (time.perf_counter() - self.t0) * 1000.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            logger.exception("warmup phase %s failed", name)
+            self.errors.append(f"{name}: {e!r}")
+        finally:
+            self.phases[name] = round((time.perf_counter() - t) * 1000.0, 1)
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.ready_ms = (time.perf_counter() - self.t0) * 1000.0
+        logger.info(
+            "ready import_ms=%.1f ready_ms=%.1f phases=%s errors=%d",
+            self.import_ms or 0.0, self.ready_ms, self.phases, len(self.errors),
+        )
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "import_ms": round(self.import_ms, 1) if self.import_ms is not None else None,
+            "ready_ms": round(self.ready_ms, 1) if self.ready_ms is not None else None,
+            "phases_ms": self.phases,
+            "errors": self.errors,
+        }
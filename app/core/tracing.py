@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logging import request_id_var
+
+logger = logging.getLogger("app.tracing")
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: list[Span] = []
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000.0
+
+
+class Trace:
+    """Span tree for one request."""
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.root = Span(name, {})
+        self.spans: list[Span] = []  # flat, for Server-Timing aggregation
+
+    def server_timing(self) -> str:
+        """`Server-Timing` value: per span name total duration (+ call count), plus the request total."""
+        totals: dict[str, list[float]] = {}
+        for s in self.spans:
+            acc = totals.setdefault(s.name, [0.0, 0])
+            acc[0] += s.duration_ms
+            acc[1] += 1
+        parts = [
+            f'{name};dur={dur:.1f}' + (f';desc="{int(n)}x"' if n > 1 else "")
+            for name, (dur, n) in totals.items()
+        ]
+        parts.append(f"total;dur={self.root.duration_ms:.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        totals: dict[str, float] = {}
+        for s in self.spans:
+            totals[s.name] = totals.get(s.name, 0.0) + s.duration_ms
+        return ",".join(f"{k}:{v:.0f}" for k, v in totals.items())
+
+    def dump(self) -> str:
+        lines: list[str] = []
+
+        def walk(s: Span, depth: int) -> None:
+            attrs = " ".join(f"{k}={v}" for k, v in s.attrs.items())
+            lines.append(f"{'  ' * depth}{s.name} {s.duration_ms:.1f}ms {attrs}".rstrip())
+            for c in s.children:
+                walk(c, depth + 1)
+
+        walk(self.root, 0)
+        return "\n".join(lines)
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent: ContextVar[Optional[Span]] = ContextVar("trace_parent", default=None)
+
+
+class _SpanScope:
+    __slots__ = ("_trace", "_span", "_token")
+
+    def __init__(self, trace: Trace, name: str, attrs: dict[str, Any]):
+        self._trace = trace
+        self._span = Span(name, attrs)
+
+    def __enter__(self) -> Span:
+        parent = _parent.get() or self._trace.root
+        parent.children.append(self._span)
+        self._trace.spans.append(self._span)
+        self._token = _parent.set(self._span)
+        return self._span
+
+    def __exit__(self, *exc: Any) -> None:
+        self._span.end = time.perf_counter()
+        _parent.reset(self._token)
+
+
+class _NoopScope:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NOOP = _NoopScope()
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """
+    Time a block as a child of the current span:
+
+        with span("xai", model=model):
+            ...
+
+    Outside a traced request (tracing disabled, startup, background work) this is a shared no-op.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return _NOOP
+    return _SpanScope(trace, name, attrs)
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: one Trace per HTTP request.
+
+    Adds `Server-Timing` and `X-Request-ID` response headers, logs one summary line per
+    request and, optionally, the full span tree for sampled slow requests.
+    """
+
+    def __init__(self, app: ASGIApp, *, slow_ms: float = 0.0, slow_sample_rate: float = 1.0):
+        self.app = app
+        self.slow_ms = slow_ms
+        self.slow_sample_rate = slow_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = ""
+        for k, v in scope.get("headers", []):
+            if k == b"x-request-id":
+                request_id = v.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        trace = Trace(request_id, f"{scope['method']} {scope['path']}")
+        trace_token = _trace.set(trace)
+        rid_token = request_id_var.set(request_id)
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                trace.root.end = time.perf_counter()
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", trace.server_timing())
+                headers.append("X-Request-ID", request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if trace.root.end is None:
+                trace.root.end = time.perf_counter()
+            total_ms = trace.root.duration_ms
+            logger.info(
+                "method=%s path=%s status=%s dur_ms=%.1f spans=%s",
+                scope["method"], scope["path"], status, total_ms, trace.summary(),
+            )
+            if self.slow_ms and total_ms >= self.slow_ms and random.random() < self.slow_sample_rate:
+                logger.warning("slow request %.1fms, span tree:\n%s", total_ms, trace.dump())
+            request_id_var.reset(rid_token)
+            _trace.reset(trace_token)
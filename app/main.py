@@ -1,21 +1,79 @@
+# ruff: noqa: E402  # imports follow the Startup timestamp on purpose (import_ms covers them)
 from __future__ import annotations
 
+import time
+
+from app.core.startup import Startup
+
+# Taken before the framework imports: import_ms in /v1/ready covers them.
+startup = Startup(time.perf_counter())
+
+import asyncio
+import contextlib
 import logging
 import os
+from collections.abc import AsyncIterator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
+from app.api import routes
 from app.api.routes import router
 from app.core.config import settings
+from app.core.load import LoadMiddleware
 from app.core.logging import setup_logging
+from app.core.serialization import ORJSONResponse
+from app.core.tracing import TracingMiddleware
+from app.models.schemas import CanonicalRecipe, LocalizedRecipe, RobotPlan
+from app.services.translation import pydantic_to_response_format
+
+
+async def warmup(startup: Startup) -> None:
+    """
+    Startup warmup (runs in the background; /v1/ready flips when done):
+      repos + profiles -> response-format schemas -> xAI connection pool -> catalog bundles
+    """
+    with startup.phase("repos"):
+        routes.recipe_repo.content_hashes()
+        routes.recipe_repo.list_meta()
+        for robot_model in routes.robot_repo.list_models():
+            routes.robot_repo.get(robot_model)
+    with startup.phase("schemas"):
+        for model in (CanonicalRecipe, RobotPlan, LocalizedRecipe):
+            pydantic_to_response_format(model)
+    with startup.phase("http_pool"):
+        await routes.xai.open()
+    # Non-ru bundles come from the translation cache (persistent with sqlite/redis), LLM only on misses.
+    for lang in [x.strip().lower() for x in settings.WARMUP_CATALOG_LANGS.split(",") if x.strip()]:
+        if not lang.startswith("ru") and not settings.XAI_API_KEY:
+            continue
+        with startup.phase(f"catalog_{lang}"):
+            async with routes.usage_meter.request("warmup"):
+                await routes.catalog.bundle(lang)
+    startup.mark_ready()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    tasks = [asyncio.create_task(warmup(app.state.startup))]
+    if settings.PREFETCH_ENABLED:
+        tasks.append(asyncio.create_task(routes.prefetcher.run()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await routes.xai.aclose()
 
 
 def create_app() -> FastAPI:
     setup_logging(logging.INFO)
-    app = FastAPI(title=settings.APP_NAME)
+    app = FastAPI(title=settings.APP_NAME, default_response_class=ORJSONResponse, lifespan=lifespan)
+    app.state.startup = startup
 
     origins = [o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip()]
     # For this MVP we don't rely on cookies/auth; keeping allow_credentials=False
@@ -26,7 +84,19 @@ def create_app() -> FastAPI:
         allow_credentials=False,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["Server-Timing", "X-Request-ID", "Idempotent-Replayed"],
+    )
+    app.add_middleware(
+        LoadMiddleware,
+        tracker=routes.load_tracker,
+        ignore_paths=frozenset({"/v1/health", "/v1/ready", "/v1/metrics"}),
     )
+    if settings.TRACING_ENABLED:
+        app.add_middleware(
+            TracingMiddleware,
+            slow_ms=settings.TRACE_SLOW_MS,
+            slow_sample_rate=settings.TRACE_SLOW_SAMPLE_RATE,
+        )
 
     # Optional: serve a simple UI from the same origin to avoid CORS altogether.
     # If /static/index.html exists, we serve it at GET /.
@@ -47,3 +117,4 @@ def create_app() -> FastAPI:
 
 
 app = create_app()
+startup.imported()
@@ -35,7 +35,9 @@ class Step(BaseModel):
     action_type: Optional[Literal["CHOP","MIX","WHISK","KNEAD","HEAT","STEAM","REST","BAKE","FRY","BOIL","UNKNOWN"]] = "UNKNOWN"
     duration_sec: Optional[int] = Field(default=None, ge=0)
     temperature_c: Optional[int] = Field(default=None, ge=0)
-    speed: Optional[int] = Field(default=None, ge=0)
+    speed: Optional[int] = Field(
+        default=None, ge=0, description="1-10 for CHOP/MIX/WHISK/KNEAD; 1-3 stirring for HEAT/STEAM."
+    )
     attachment: Optional[str] = None
 
 
@@ -113,12 +115,56 @@ class GenerateRequest(BaseModel):
     constraints: dict[str, Any] = Field(default_factory=dict)
 
 
+class GenerateMultiRequest(BaseModel):
+    query: str = Field(min_length=2, max_length=200)
+    lang: str = Field(default="ru", min_length=2, max_length=10)
+    robot_models: list[str] = Field(
+        min_length=1, max_length=5, description="First model is planned by the LLM, the rest are retargeted."
+    )
+    constraints: dict[str, Any] = Field(default_factory=dict)
+
+
 class ContinueRequest(BaseModel):
     session_id: str
     answers: dict[str, Any] = Field(default_factory=dict)
 
 
+class TokenUsage(BaseModel):
+    """LLM usage of one API request (all xAI calls it made)."""
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    reasoning_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+    cache_only: bool = False  # daily LLM budget exhausted: served from cached results only
+
+
 class GenerateResponse(BaseModel):
     session_id: str
     result: Optional[RecipeResponse] = None
     questions: list[dict[str, Any]] = Field(default_factory=list)
+    usage: Optional[TokenUsage] = None
+
+
+class GenerateMultiItem(BaseModel):
+    robot_model: str
+    session_id: str
+    result: Optional[RecipeResponse] = None
+    questions: list[dict[str, Any]] = Field(default_factory=list)
+
+
+class GenerateMultiResponse(BaseModel):
+    items: list[GenerateMultiItem] = Field(default_factory=list)
+    usage: Optional[TokenUsage] = None
+
+
+class SessionState(BaseModel):
+    """Generate/continue dialog state; kept as validated models to avoid re-parsing per call."""
+    req: GenerateRequest
+    canonical_recipe: CanonicalRecipe
+    answers: dict[str, Any] = Field(default_factory=dict)
+    last_questions: list[dict[str, Any]] = Field(default_factory=list)
+    # Last adaptation outcome; lets servings-only answers be rescaled locally.
+    plan: Optional[RobotPlan] = None
+    localized: Optional[LocalizedRecipe] = None
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import orjson
+from cachetools import LRUCache
+
+from app.core.http_cache import encode_variants
+from app.core.serialization import content_hash, dumps
+from app.core.tracing import span
+from app.models.schemas import CanonicalRecipe, RobotPlan, RobotProfile, RobotProgramStep
+from app.services.retarget import PlanRetargeter
+from app.services.translation import TRANSLATION_VERSION, TranslationService
+from app.storage.recipes import RecipeRepo
+from app.storage.robot_profiles import RobotProfileRepo
+from app.validators.robot_validator import RobotPlanValidator
+
+
+def plan_from_recipe(recipe: CanonicalRecipe, profile: RobotProfile) -> RobotPlan:
+    """
+    Deterministic robot program for a structured catalog recipe (no LLM).
+
+    Steps with a known action_type and duration become program steps (speeds rescaled from
+    the canonical scale, attachments mapped by role onto the profile); everything else
+    stays a manual step.
+    """
+    program: list[RobotProgramStep] = []
+    texts: list[str] = []
+    manual: list[str] = []
+    for s in recipe.steps:
+        if s.action_type and s.action_type != "UNKNOWN" and s.duration_sec:
+            program.append(RobotProgramStep(
+                mode=s.action_type,
+                duration_sec=s.duration_sec,
+                speed=s.speed,
+                temperature_c=s.temperature_c,
+                attachment=s.attachment,
+            ))
+            texts.append(s.text)
+        else:
+            manual.append(s.text)
+
+    plan, _, unmapped = PlanRetargeter.from_canonical(RobotPlan(robot_program=program), profile)
+    for i in unmapped:
+        plan.manual_steps.append(texts[i])
+        plan.cannot_map.append(f"{program[i].mode}: {texts[i]}")
+    plan.manual_steps.extend(manual)
+    return RobotPlanValidator.validate(plan, profile)
+
+
+@dataclass
+class _Version:
+    inputs: str
+    version: str
+    item_hashes: dict[str, str]
+    items: dict[str, bytes]
+
+
+@dataclass(frozen=True)
+class Bundle:
+    lang: str
+    version: str
+    since: Optional[str]  # base version for a delta; None for a full bundle
+    variants: dict[str, bytes] = field(repr=False)  # content-encoding -> body
+
+    def etag(self, encoding: str) -> str:
+        base = self.version if self.since is None else f"{self.version}~{self.since}"
+        return f'"{base}"' if encoding == "identity" else f'"{base}.{encoding}"'
+
+    def etags(self) -> list[str]:
+        return [self.etag(enc) for enc in self.variants]
+
+
+@dataclass
+class _LangState:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    current: Optional[_Version] = None
+    hist: OrderedDict[str, dict[str, str]] = field(default_factory=OrderedDict)
+
+
+class CatalogBundler:
+    """
+    Offline sync bundles: every catalog recipe localized for one language plus
+    deterministic robot programs for every robot profile.
+
+    A version is the hash of its items; it is rebuilt only when recipes, profiles or the
+    translation version change. Encoded bodies (full or delta against a recent version)
+    are built once and served as static bytes. Built state is kept for the `max_langs`
+    most recently requested languages; callers validate `lang` against the supported list.
+    """
+
+    def __init__(
+        self,
+        recipes: RecipeRepo,
+        profiles: RobotProfileRepo,
+        translator: TranslationService,
+        *,
+        history: int = 20,
+        concurrency: int = 4,
+        max_langs: int = 16,
+    ):
+        self.recipes = recipes
+        self.profiles = profiles
+        self.translator = translator
+        self.history = history
+        self._sem = asyncio.Semaphore(concurrency)
+        self._langs: LRUCache = LRUCache(maxsize=max_langs)  # lang -> _LangState
+        self._encoded: LRUCache = LRUCache(maxsize=4 * max_langs)
+
+    async def bundle(self, lang: str, since: Optional[str] = None) -> Bundle:
+        lang = lang.lower()
+        state = self._langs.get(lang)
+        if state is None:
+            state = self._langs[lang] = _LangState()
+        current = await self._ensure(lang, state)
+
+        base = None
+        if since and since != current.version:
+            base = state.hist.get(since)
+        since = since if base is not None or since == current.version else None
+
+        key = (lang, current.version, since)
+        bundle = self._encoded.get(key)
+        if bundle is None:
+            with span("catalog", op="encode"):
+                raw = self._render(lang, current, since, base)
+                bundle = Bundle(lang=lang, version=current.version, since=since, variants=encode_variants(raw))
+            self._encoded[key] = bundle
+        return bundle
+
+    async def _ensure(self, lang: str, state: _LangState) -> _Version:
+        recipe_hashes = self.recipes.content_hashes()
+        profiles = [p for p in (self.profiles.get(m) for m in self.profiles.list_models()) if p is not None]
+        inputs = hashlib.sha256(orjson.dumps([
+            lang,
+            TRANSLATION_VERSION,
+            recipe_hashes,
+            [content_hash(p) for p in profiles],
+        ], option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+        current = state.current
+        if current is not None and current.inputs == inputs:
+            return current
+
+        async with state.lock:
+            current = state.current
+            if current is not None and current.inputs == inputs:
+                return current
+            with span("catalog", op="build", lang=lang):
+                current = await self._build(lang, inputs, list(recipe_hashes), profiles)
+            state.current = current
+            state.hist[current.version] = current.item_hashes
+            while len(state.hist) > self.history:
+                state.hist.popitem(last=False)
+            return current
+
+    async def _build(self, lang: str, inputs: str, recipe_ids: list[str], profiles: list[RobotProfile]) -> _Version:
+        async def item(recipe_id: str) -> Optional[bytes]:
+            recipe = self.recipes.get(recipe_id)
+            if recipe is None:
+                return None
+            async with self._sem:
+                localized = await self.translator.localize(recipe, lang)
+            return dumps({
+                "id": recipe_id,
+                "content_hash": self.recipes.content_hash(recipe_id),
+                "canonical_recipe": self.recipes.get_fragment(recipe_id),
+                "localized": localized,
+                "robot_programs": {p.robot_model: plan_from_recipe(recipe, p) for p in profiles},
+            })
+
+        built = await asyncio.gather(*(item(rid) for rid in recipe_ids))
+        items = {rid: b for rid, b in zip(recipe_ids, built) if b is not None}
+        item_hashes = {rid: hashlib.sha256(b).hexdigest()[:16] for rid, b in items.items()}
+        version = hashlib.sha256(
+            orjson.dumps([lang, sorted(item_hashes.items())])
+        ).hexdigest()[:20]
+        return _Version(inputs=inputs, version=version, item_hashes=item_hashes, items=items)
+
+    @staticmethod
+    def _render(lang: str, current: _Version, since: Optional[str], base: Optional[dict[str, str]]) -> bytes:
+        if since is None:
+            ids = list(current.items)
+            removed: list[str] = []
+        elif base is None:  # since == current version: nothing changed
+            ids, removed = [], []
+        else:
+            ids = [rid for rid, h in current.item_hashes.items() if base.get(rid) != h]
+            removed = [rid for rid in base if rid not in current.item_hashes]
+        return dumps({
+            "lang": lang,
+            "version": current.version,
+            "since": since,
+            "full": since is None,
+            "removed": removed,
+            "items": [orjson.Fragment(current.items[rid]) for rid in ids],
+        })
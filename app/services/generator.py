@@ -1,21 +1,39 @@
 from __future__ import annotations
 
+import asyncio
 import uuid
 from typing import Any, Optional
 
+from app.core.serialization import content_hash, dumps_str, fragment
+from app.core.tracing import span
 from app.models.schemas import (
     CanonicalRecipe,
+    GenerateMultiRequest,
     GenerateRequest,
     LocalizedRecipe,
     Origin,
     RecipeResponse,
     RobotPlan,
     RobotProfile,
+    RobotProgramStep,
+)
+from app.services.prompts import prompt_adapt_to_robot, prompt_extract_recipe, prompt_retarget_steps
+from app.services.retarget import PlanRetargeter
+from app.services.scaling import (
+    capacity_warnings,
+    is_servings_question,
+    rescale_localized_lines,
+    scale_plan,
+    scale_recipe,
+    servings_answer,
 )
-from app.services.prompts import prompt_adapt_to_robot, prompt_extract_recipe
 from app.services.translation import TranslationService, pydantic_to_response_format
+from app.storage.cache import Cache
 from app.validators.robot_validator import RobotPlanValidator
-from app.xai.client import XAIClient
+from app.xai.router import TASK_ADAPT, TASK_EXTRACT, TASK_REPLAN, ModelRouter
+
+# Bump when extraction/adaptation prompts or their schemas change: invalidates cached recipes and plans.
+GENERATION_VERSION = "1"
 
 
 def web_search_tool(allowed_domains: list[str] | None, excluded_domains: list[str] | None) -> dict[str, Any]:
@@ -34,27 +52,20 @@ def web_search_tool(allowed_domains: list[str] | None, excluded_domains: list[st
     return tool
 
 
-def json_dumps(obj: Any) -> str:
-    import json
-    return json.dumps(obj, ensure_ascii=False, indent=2, default=str)
-
-
 class RecipeGenerator:
     def __init__(
         self,
         *,
-        xai: XAIClient,
-        model_tooling: str,
-        model_general: str,
+        router: ModelRouter,
         translator: TranslationService,
         store: bool = False,
         allowed_domains: Optional[list[str]] = None,
         excluded_domains: Optional[list[str]] = None,
+        cache: Optional[Cache] = None,
     ):
-        self.xai = xai
-        self.model_tooling = model_tooling
-        self.model_general = model_general
+        self.router = router
         self.translator = translator
+        self.cache = cache
         self.store = store
         self.allowed_domains = allowed_domains or []
         self.excluded_domains = excluded_domains or []
@@ -64,35 +75,20 @@ class RecipeGenerator:
         req: GenerateRequest,
         profile: RobotProfile,
         mapping_rules: dict[str, Any],
-    ) -> tuple[str, Optional[RecipeResponse], list[dict[str, Any]], CanonicalRecipe, RobotPlan]:
+    ) -> tuple[str, Optional[RecipeResponse], list[dict[str, Any]], CanonicalRecipe, RobotPlan, LocalizedRecipe]:
         """
         Full pipeline (initial):
           web_search + extract -> adapt -> validate -> localize -> assemble
 
         Returns:
-          session_id, result_or_none, questions, canonical_recipe, robot_plan
+          session_id, result_or_none, questions, canonical_recipe, robot_plan, localized
         """
         session_id = str(uuid.uuid4())
 
-        # 1) Search+Extract (tooling model, structured output)
-        sys, usr = prompt_extract_recipe(req.query)
-        messages = [
-            {"role": "system", "content": sys},
-            {"role": "user", "content": usr},
-        ]
-        tools = [web_search_tool(self.allowed_domains or None, self.excluded_domains or None)]
-        resp = await self.xai.create_response(
-            model=self.model_tooling,
-            input_messages=messages,
-            tools=tools,
-            response_format=pydantic_to_response_format(CanonicalRecipe),
-            store=self.store,
-            max_output_tokens=3000,
-        )
-        recipe_json = self.xai.extract_output_text(resp)
-        canonical = CanonicalRecipe.model_validate_json(recipe_json)
+        # 1) Search+Extract (tooling model only, structured output)
+        canonical = await self.extract(req.query)
 
-        # 2) Adapt to robot (general model, structured output)
+        # 2) Adapt to robot (routed model, structured output)
         plan = await self.adapt_only(
             canonical=canonical,
             profile=profile,
@@ -103,6 +99,7 @@ class RecipeGenerator:
 
         # 3) Validate locally (clamp + warnings)
         plan = RobotPlanValidator.validate(plan, profile)
+        plan.warnings.extend(capacity_warnings(canonical, profile))
 
         # 4) Localize (for UI; can be delayed until questions resolved if you want)
         localized = await self.translator.localize(canonical, req.lang)
@@ -117,9 +114,40 @@ class RecipeGenerator:
         )
 
         if plan.questions:
-            return session_id, None, plan.questions, canonical, plan
+            return session_id, None, plan.questions, canonical, plan, localized
 
-        return session_id, result, [], canonical, plan
+        return session_id, result, [], canonical, plan, localized
+
+    async def extract(self, query: str) -> CanonicalRecipe:
+        """web_search + structured extraction; cached per (normalized query, domain lists)."""
+        key = Cache._key(
+            "extract", [" ".join(query.lower().split()), self.allowed_domains, self.excluded_domains, GENERATION_VERSION]
+        )
+        if self.cache is not None:
+            cached = await self.cache.get_model(key, CanonicalRecipe)
+            if cached is not None:
+                return cached
+
+        sys, usr = prompt_extract_recipe(query)
+        messages = [
+            {"role": "system", "content": sys},
+            {"role": "user", "content": usr},
+        ]
+        tools = [web_search_tool(self.allowed_domains or None, self.excluded_domains or None)]
+        with span("extract"):
+            resp = await self.router.create_response(
+                task=TASK_EXTRACT,
+                input_messages=messages,
+                tools=tools,
+                response_format=pydantic_to_response_format(CanonicalRecipe),
+                store=self.store,
+                max_output_tokens=3000,
+            )
+            recipe_json = self.router.extract_output_text(resp)
+            canonical = CanonicalRecipe.model_validate_json(recipe_json)
+        if self.cache is not None:
+            await self.cache.set_model(key, canonical)
+        return canonical
 
     async def resume_adaptation(
         self,
@@ -130,7 +158,7 @@ class RecipeGenerator:
         mapping_rules: dict[str, Any],
         req: GenerateRequest,
         answers: dict[str, Any],
-    ) -> tuple[Optional[RecipeResponse], list[dict[str, Any]], RobotPlan]:
+    ) -> tuple[Optional[RecipeResponse], list[dict[str, Any]], RobotPlan, LocalizedRecipe]:
         """
         Resume from stored canonical recipe + user answers:
           adapt -> validate -> localize -> assemble
@@ -143,6 +171,7 @@ class RecipeGenerator:
             answers=answers or {},
         )
         plan = RobotPlanValidator.validate(plan, profile)
+        plan.warnings.extend(capacity_warnings(canonical, profile))
 
         localized = await self.translator.localize(canonical, req.lang)
         result = self._assemble(
@@ -155,9 +184,214 @@ class RecipeGenerator:
         )
 
         if plan.questions:
-            return None, plan.questions, plan
+            return None, plan.questions, plan, localized
+
+        return result, [], plan, localized
+
+    async def rescale_servings(
+        self,
+        *,
+        session_id: str,
+        canonical: CanonicalRecipe,
+        plan: RobotPlan,
+        localized: LocalizedRecipe,
+        profile: RobotProfile,
+        req: GenerateRequest,
+        new_answers: dict[str, Any],
+    ) -> Optional[tuple[Optional[RecipeResponse], list[dict[str, Any]], RobotPlan, LocalizedRecipe, CanonicalRecipe]]:
+        """
+        Deterministic path for a servings-only answer (no LLM adaptation):
+          scale recipe + plan -> validate -> patch localized quantities -> assemble
+
+        Returns None when the answer needs the LLM (other questions pending,
+        unknown base servings, non-servings answers).
+        """
+        servings = servings_answer(new_answers)
+        if servings is None or set(new_answers) != {"servings"}:
+            return None
+        if not all(is_servings_question(q) for q in plan.questions):
+            return None
+        with span("rescale", servings=servings):
+            scaled = scale_recipe(canonical, servings)
+            if scaled is None:
+                return None
+            plan = scale_plan(plan, servings / canonical.servings)  # type: ignore[operator]
+            plan.questions = []
+        plan = RobotPlanValidator.validate(plan, profile)
+        plan.warnings.extend(capacity_warnings(scaled, profile))
+
+        patched = None
+        if not req.lang.lower().startswith("ru"):
+            patched = rescale_localized_lines(localized, canonical, scaled)
+        localized = patched or await self.translator.localize(scaled, req.lang)
+
+        result = self._assemble(
+            recipe_id=session_id,
+            origin=Origin.web,
+            canonical=scaled,
+            localized=localized,
+            plan=plan,
+            lang=req.lang,
+        )
+        return result, [], plan, localized, scaled
 
-        return result, [], plan
+    async def generate_multi(
+        self,
+        req: GenerateMultiRequest,
+        profiles: list[RobotProfile],
+        mapping_rules: dict[str, Any],
+    ) -> tuple[
+        CanonicalRecipe, LocalizedRecipe, list[tuple[str, Optional[RecipeResponse], list[dict[str, Any]], RobotPlan]]
+    ]:
+        """
+        One recipe, several robots:
+          full pipeline for the first profile, then retarget its plan onto the others.
+        Search/extract and localization run once; per-robot work is deterministic
+        except for steps the retargeter can't map.
+
+        Returns:
+          canonical_recipe, localized, and per profile (same order):
+          session_id, result_or_none, questions, robot_plan
+        """
+        primary, others = profiles[0], profiles[1:]
+        base_req = GenerateRequest(
+            query=req.query, lang=req.lang, robot_model=primary.robot_model, constraints=req.constraints
+        )
+        session_id, result, questions, canonical, plan, localized = await self.generate_from_web(
+            base_req, primary, mapping_rules
+        )
+        out = [(session_id, result, questions, plan)]
+
+        plans = await asyncio.gather(*(
+            self.retarget_plan(
+                plan=plan,
+                source=primary,
+                target=target,
+                canonical=canonical,
+                mapping_rules=mapping_rules,
+                req=base_req.model_copy(update={"robot_model": target.robot_model}),
+                answers={},
+            )
+            for target in others
+        ))
+        for target, target_plan in zip(others, plans):
+            sid = str(uuid.uuid4())
+            target_result = self._assemble(
+                recipe_id=sid,
+                origin=Origin.web,
+                canonical=canonical,
+                localized=localized,
+                plan=target_plan,
+                lang=req.lang,
+            )
+            if target_plan.questions:
+                out.append((sid, None, target_plan.questions, target_plan))
+            else:
+                out.append((sid, target_result, [], target_plan))
+        return canonical, localized, out
+
+    async def retarget_plan(
+        self,
+        *,
+        plan: RobotPlan,
+        source: RobotProfile,
+        target: RobotProfile,
+        canonical: CanonicalRecipe,
+        mapping_rules: dict[str, Any],
+        req: GenerateRequest,
+        answers: dict[str, Any],
+    ) -> RobotPlan:
+        """
+        Map a validated plan onto another robot profile:
+          deterministic retarget -> LLM for unmapped steps only (full re-plan as last resort) -> validate
+        """
+        with span("retarget", robot_model=target.robot_model):
+            new_plan, mapped, unmapped = PlanRetargeter.retarget(plan, source, target)
+        if unmapped:
+            unmapped_steps = [plan.robot_program[i] for i in unmapped]
+            replanned = await self._replan_steps(
+                steps=unmapped_steps, source=source, target=target, canonical=canonical, req=req
+            )
+            if replanned is None:
+                new_plan = await self.adapt_only(
+                    canonical=canonical, profile=target, mapping_rules=mapping_rules, req=req, answers=answers
+                )
+            else:
+                fill = iter(replanned.robot_program)
+                program: list[RobotProgramStep] = []
+                for group in mapped:
+                    if group is not None:
+                        program.extend(group)
+                    elif replanned.robot_program:
+                        program.append(next(fill))
+                new_plan.robot_program = program
+                new_plan.manual_steps.extend(replanned.manual_steps)
+                new_plan.warnings.extend(replanned.warnings)
+                new_plan.cannot_map.extend(replanned.cannot_map)
+
+        new_plan = RobotPlanValidator.validate(new_plan, target)
+        new_plan.warnings.extend(capacity_warnings(canonical, target))
+        return new_plan
+
+    async def _replan_steps(
+        self,
+        *,
+        steps: list[RobotProgramStep],
+        source: RobotProfile,
+        target: RobotProfile,
+        canonical: CanonicalRecipe,
+        req: GenerateRequest,
+    ) -> Optional[RobotPlan]:
+        """LLM fallback for steps the retargeter couldn't map; None if the answer can't be spliced back."""
+        key = Cache._key("replan", [
+            content_hash(canonical),
+            source.robot_model,
+            content_hash(target),
+            [s.model_dump() for s in steps],
+            req.lang,
+            GENERATION_VERSION,
+        ])
+        replanned = await self.cache.get_model(key, RobotPlan) if self.cache is not None else None
+        if replanned is None:
+            replanned = await self._replan_llm(steps=steps, source=source, target=target, canonical=canonical, req=req)
+            if self.cache is not None:
+                await self.cache.set_model(key, replanned)
+        if replanned.robot_program and len(replanned.robot_program) != len(steps):
+            return None
+        if not replanned.robot_program and not replanned.cannot_map:
+            return None
+        return replanned
+
+    async def _replan_llm(
+        self,
+        *,
+        steps: list[RobotProgramStep],
+        source: RobotProfile,
+        target: RobotProfile,
+        canonical: CanonicalRecipe,
+        req: GenerateRequest,
+    ) -> RobotPlan:
+        sys, usr = prompt_retarget_steps()
+        payload = {
+            "recipe": fragment(canonical),
+            "source_robot_model": source.robot_model,
+            "target_robot_profile": fragment(target),
+            "unmapped_steps": steps,
+            "target_language": req.lang,
+        }
+        messages = [
+            {"role": "system", "content": sys},
+            {"role": "user", "content": usr + "\n\nINPUT_PAYLOAD:\n" + dumps_str(payload)},
+        ]
+        with span("replan", robot_model=target.robot_model, steps=len(steps)):
+            resp = await self.router.create_response(
+                task=TASK_REPLAN,
+                input_messages=messages,
+                response_format=pydantic_to_response_format(RobotPlan),
+                store=self.store,
+                max_output_tokens=1500,
+            )
+            return RobotPlan.model_validate_json(self.router.extract_output_text(resp))
 
     async def adapt_only(
         self,
@@ -180,11 +414,29 @@ class RecipeGenerator:
 
         Output:
           - RobotPlan JSON (robot_program/manual_steps/warnings/questions/cannot_map)
+
+        Plans are cached per full input (recipe, profile, rules, constraints, answers, lang, query).
         """
+        key = Cache._key("adapt", [
+            content_hash(canonical),
+            content_hash(profile),
+            mapping_rules,
+            req.constraints,
+            answers,
+            req.lang,
+            req.query,
+            GENERATION_VERSION,
+        ])
+        if self.cache is not None:
+            cached = await self.cache.get_model(key, RobotPlan)
+            if cached is not None:
+                return cached
+
         sys, usr = prompt_adapt_to_robot()
         payload = {
-            "recipe": canonical.model_dump(),
-            "robot_profile": profile.model_dump(),
+            # Fragments embed pydantic-core JSON directly (no dict round trip).
+            "recipe": fragment(canonical),
+            "robot_profile": fragment(profile),
             "mapping_rules": mapping_rules,
             "constraints": req.constraints,
             "answers": answers,
@@ -203,19 +455,23 @@ class RecipeGenerator:
                     + "- Never exceed robot limits.\n"
                     + "- robot_program should be runnable and explicit (mode/speed/temp/duration/attachment).\n"
                     + "\n\nINPUT_PAYLOAD:\n"
-                    + json_dumps(payload)
+                    + dumps_str(payload)
                 ),
             },
         ]
-        resp = await self.xai.create_response(
-            model=self.model_general,
-            input_messages=messages,
-            response_format=pydantic_to_response_format(RobotPlan),
-            store=self.store,
-            max_output_tokens=2500,
-        )
-        txt = self.xai.extract_output_text(resp)
-        return RobotPlan.model_validate_json(txt)
+        with span("adapt", robot_model=profile.robot_model):
+            resp = await self.router.create_response(
+                task=TASK_ADAPT,
+                input_messages=messages,
+                response_format=pydantic_to_response_format(RobotPlan),
+                store=self.store,
+                max_output_tokens=2500,
+            )
+            txt = self.router.extract_output_text(resp)
+            plan = RobotPlan.model_validate_json(txt)
+        if self.cache is not None:
+            await self.cache.set_model(key, plan)
+        return plan
 
     def _assemble(
         self,
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import time
+
+import orjson
+
+from app.models.schemas import GenerateRequest
+
+
+class CountMinSketch:
+    """
+    Count-min sketch with exponential decay: counts halve every `half_life_s`.
+
+    Decay is applied lazily: new increments are weighted by exp(rate * age) and
+    estimates divided by it; counters are rebased before the weights overflow.
+    Estimates never undercount (up to decay).
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4, half_life_s: float = 6 * 3600.0):
+        self.width = width
+        self.depth = depth
+        self._rate = math.log(2) / half_life_s
+        self._t0 = time.monotonic()
+        self._rows = [[0.0] * width for _ in range(depth)]
+
+    def _indexes(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[8 * i:8 * i + 8], "little") % self.width for i in range(self.depth)]
+
+    def _weight(self) -> float:
+        w = math.exp(self._rate * (time.monotonic() - self._t0))
+        if w > 1e12:
+            for row in self._rows:
+                for i, v in enumerate(row):
+                    row[i] = v / w
+            self._t0 = time.monotonic()
+            w = 1.0
+        return w
+
+    def add(self, key: str, count: float = 1.0) -> float:
+        """Count `key`; returns its new (decayed) estimate."""
+        w = self._weight()
+        est = math.inf
+        for row, i in zip(self._rows, self._indexes(key)):
+            row[i] += count * w
+            est = min(est, row[i])
+        return est / w
+
+    def estimate(self, key: str) -> float:
+        w = self._weight()
+        return min(row[i] for row, i in zip(self._rows, self._indexes(key))) / w
+
+
+class PopularityTracker:
+    """
+    Popular generate combinations (query, lang, robot_model, constraints) and popular
+    languages of the catalog read endpoints.
+
+    Counts live in a decaying count-min sketch; bounded candidate sets keep the
+    heaviest keys so the top N can be listed.
+    """
+
+    def __init__(self, *, candidates: int = 256, lang_candidates: int = 32, half_life_s: float = 6 * 3600.0):
+        self.sketch = CountMinSketch(half_life_s=half_life_s)
+        self.candidates = candidates
+        self.lang_candidates = lang_candidates
+        self._top: dict[str, GenerateRequest] = {}
+        self._langs: dict[str, str] = {}
+
+    @staticmethod
+    def _key(req: GenerateRequest) -> str:
+        return orjson.dumps(req.model_dump(), option=orjson.OPT_SORT_KEYS).decode("utf-8")
+
+    def _admit(self, top: dict, limit: int, key: str, value: object) -> None:
+        est = self.sketch.add(key)
+        if key in top:
+            return
+        if len(top) >= limit:
+            weakest = min(top, key=self.sketch.estimate)
+            if self.sketch.estimate(weakest) >= est:
+                return
+            del top[weakest]
+        top[key] = value
+
+    def _ranked(self, top: dict, n: int, min_count: float) -> list[tuple[object, float]]:
+        ranked = sorted(((self.sketch.estimate(k), k) for k in top), reverse=True)
+        return [(top[k], est) for est, k in ranked[:n] if est >= min_count]
+
+    def observe(self, req: GenerateRequest) -> None:
+        self._admit(self._top, self.candidates, self._key(req), req)
+
+    def observe_lang(self, lang: str) -> None:
+        lang = lang.lower()
+        self._admit(self._langs, self.lang_candidates, f"lang:{lang}", lang)
+
+    def top(self, n: int, min_count: float = 0.0) -> list[tuple[GenerateRequest, float]]:
+        return self._ranked(self._top, n, min_count)  # type: ignore[return-value]
+
+    def top_langs(self, n: int, min_count: float = 0.0) -> list[tuple[str, float]]:
+        return self._ranked(self._langs, n, min_count)  # type: ignore[return-value]
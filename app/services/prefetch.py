@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+from app.core.load import LoadTracker
+from app.core.tracing import span
+from app.models.schemas import GenerateRequest, RobotProfile
+from app.services.catalog import CatalogBundler
+from app.services.generator import RecipeGenerator
+from app.services.popularity import PopularityTracker
+from app.storage.robot_profiles import RobotProfileRepo
+from app.xai.usage import BudgetExceeded, UsageMeter
+
+logger = logging.getLogger("app.prefetch")
+
+
+class Prefetcher:
+    """
+    Background cache warming for popular generate combinations and catalog languages:
+      top-N (query, lang, robot_model, constraints) -> extract -> adapt -> localize
+      top languages of recipe/catalog reads -> catalog bundle (localizes every recipe)
+
+    Each stage goes through the same caches as live requests, so warm entries cost a cache
+    read and only missing/expired ones call the LLM. Work runs only after `idle_s` without
+    live requests (checked before every stage) and stops when the daily LLM budget is spent.
+    """
+
+    def __init__(
+        self,
+        *,
+        generator: RecipeGenerator,
+        profiles: RobotProfileRepo,
+        popularity: PopularityTracker,
+        catalog: CatalogBundler,
+        load: LoadTracker,
+        usage: UsageMeter,
+        mapping_rules: dict[str, Any],
+        top_n: int = 20,
+        top_langs: int = 3,
+        min_count: float = 2.0,
+        interval_s: float = 60.0,
+        idle_s: float = 5.0,
+    ):
+        self.generator = generator
+        self.profiles = profiles
+        self.popularity = popularity
+        self.catalog = catalog
+        self.load = load
+        self.usage = usage
+        self.mapping_rules = mapping_rules
+        self.top_n = top_n
+        self.top_langs = top_langs
+        self.min_count = min_count
+        self.interval_s = interval_s
+        self.idle_s = idle_s
+        self.stats = {"cycles": 0, "warmed": 0, "catalogs_warmed": 0, "interrupted": 0, "failed": 0, "llm_calls": 0}
+
+    def _idle(self) -> bool:
+        return (
+            self.load.in_flight == 0
+            and self.load.idle_for() >= self.idle_s
+            and self.usage.budget_retry_after() is None
+        )
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.cycle()
+            except Exception:
+                logger.exception("prefetch cycle failed")
+
+    async def cycle(self) -> int:
+        """One warming pass; returns the number of combinations and catalog languages warmed."""
+        self.stats["cycles"] += 1
+        before = self.stats["warmed"] + self.stats["catalogs_warmed"]
+        await self.usage.refresh_budget()
+        if not (await self._warm_generate() and await self._warm_catalogs()):
+            self.stats["interrupted"] += 1
+        return self.stats["warmed"] + self.stats["catalogs_warmed"] - before
+
+    async def _warm_generate(self) -> bool:
+        for req, _ in self.popularity.top(self.top_n, self.min_count):
+            profile = self.profiles.get(req.robot_model)
+            if profile is None:
+                continue
+            if not await self._warm(req, profile):
+                return False
+        return True
+
+    async def _warm_catalogs(self) -> bool:
+        for lang, _ in self.popularity.top_langs(self.top_langs, self.min_count):
+            if not await self._warm_catalog(lang):
+                return False
+        return True
+
+    async def _warm_catalog(self, lang: str) -> bool:
+        """Build the catalog bundle for `lang`; False when the pass has to stop."""
+        async with self.usage.request("prefetch") as usage:
+            with span("prefetch", lang=lang):
+                try:
+                    if not self._idle():
+                        return False
+                    await self.catalog.bundle(lang)
+                except BudgetExceeded:
+                    return False
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.warning("prefetch failed catalog lang=%s: %s", lang, e)
+                    return True
+                finally:
+                    self.stats["llm_calls"] += usage.totals.calls
+        self.stats["catalogs_warmed"] += 1
+        return True
+
+    async def _warm(self, req: GenerateRequest, profile: RobotProfile) -> bool:
+        """Warm one combination; False when the pass has to stop (live traffic or budget)."""
+        async with self.usage.request("prefetch") as usage:
+            with span("prefetch"):
+                try:
+                    if not self._idle():
+                        return False
+                    canonical = await self.generator.extract(req.query)
+                    if not self._idle():
+                        return False
+                    await self.generator.adapt_only(
+                        canonical=canonical, profile=profile, mapping_rules=self.mapping_rules, req=req, answers={}
+                    )
+                    if not self._idle():
+                        return False
+                    await self.generator.translator.localize(canonical, req.lang)
+                except BudgetExceeded:
+                    return False
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.warning(
+                        "prefetch failed query=%r robot_model=%s lang=%s: %s", req.query, req.robot_model, req.lang, e
+                    )
+                    return True
+                finally:
+                    self.stats["llm_calls"] += usage.totals.calls
+        self.stats["warmed"] += 1
+        return True
@@ -45,3 +45,19 @@ def prompt_localize(lang: str) -> tuple[str, str]:
         "Return ONLY JSON for the LocalizedRecipe schema."
     )
     return system, user
+
+
+def prompt_retarget_steps() -> tuple[str, str]:
+    system = (
+        "You are a cooking-to-robot planner. "
+        "Some steps of an existing robot program could not be mapped onto a different robot automatically. "
+        "Re-plan ONLY those steps for the target robot profile. "
+        "Never exceed robot limits. If a step is impossible on the target, add it to cannot_map and manual_steps."
+    )
+    user = (
+        "Return exactly one robot_program step per entry in unmapped_steps, in the same order.\n"
+        "If any of them can't run on the target robot, return an empty robot_program and explain in "
+        "cannot_map + manual_steps instead.\n"
+        "Return ONLY valid JSON for the RobotPlan schema."
+    )
+    return system, user
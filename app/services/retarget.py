@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from app.models.schemas import RobotModeSpec, RobotPlan, RobotProfile, RobotProgramStep
+from app.services.scaling import CAPACITY_WARNING_PREFIX
+from app.validators.robot_validator import is_profile_warning
+
+# Attachment role -> known names across device lines (move to DB/config later).
+ATTACHMENT_ROLES: dict[str, set[str]] = {
+    "blade": {"knife", "blade"},
+    "whisk": {"whisk", "butterfly_whisk"},
+    "knead": {"knead_hook"},
+    "steam": {"steam_basket", "varoma"},
+    "basket": {"simmering_basket"},
+}
+# Scale of Step.speed in canonical recipes, per mode: motor modes use the normalized 1-10 scale,
+# heating modes a 1-3 stirring scale. Catalog programs are rescaled from it onto each profile.
+CANONICAL_SPEED_SCALES: dict[str, tuple[int, int]] = {
+    "CHOP": (1, 10),
+    "MIX": (1, 10),
+    "WHISK": (1, 10),
+    "KNEAD": (1, 10),
+    "HEAT": (1, 3),
+    "STEAM": (1, 3),
+}
+_CANONICAL_PROFILE = RobotProfile(
+    robot_model="CANONICAL",
+    bowl_capacity_ml=100_000,
+    bowl_max_fill_ml=100_000,
+    bowl_max_mass_g=100_000,
+    modes=[RobotModeSpec(mode=m, speed_range=r) for m, r in CANONICAL_SPEED_SCALES.items()],
+)
+# If the target lacks the role, devices commonly do the job with another tool (TM6 kneads with the blade).
+_ROLE_FALLBACK: dict[str, str] = {
+    "knead": "blade",
+    "basket": "steam",
+}
+
+
+def attachment_role(name: str) -> Optional[str]:
+    for role, names in ATTACHMENT_ROLES.items():
+        if name in names:
+            return role
+    return None
+
+
+def _speed_scale(spec: RobotModeSpec) -> Optional[tuple[int, int]]:
+    if spec.speed_range is not None:
+        return spec.speed_range
+    if spec.stir_speeds:
+        return min(spec.stir_speeds), max(spec.stir_speeds)
+    return None
+
+
+def _rescale(value: int, src: tuple[int, int], dst: tuple[int, int]) -> int:
+    (a, b), (c, d) = src, dst
+    if b == a:
+        return c if value <= a else d
+    t = min(max((value - a) / (b - a), 0.0), 1.0)
+    return int(round(c + t * (d - c)))
+
+
+def _source_specific(warning: str) -> bool:
+    return warning.startswith(CAPACITY_WARNING_PREFIX) or is_profile_warning(warning)
+
+
+def _idiom(profile: RobotProfile, name: str) -> Optional[dict[str, Any]]:
+    idiom = profile.idioms.get(name)
+    if isinstance(idiom, dict) and isinstance(idiom.get("mode"), str):
+        return idiom
+    return None
+
+
+class PlanRetargeter:
+    """
+    Deterministic RobotPlan mapping between robot profiles.
+
+    Maps modes (directly or via profile idioms), rescales speeds between speed scales,
+    fits temperatures and durations into target limits and swaps attachments by role.
+    Steps that can't be mapped are reported by index so only they go to the LLM.
+    """
+
+    @classmethod
+    def retarget(
+        cls, plan: RobotPlan, source: RobotProfile, target: RobotProfile
+    ) -> tuple[RobotPlan, list[Optional[list[RobotProgramStep]]], list[int]]:
+        """
+        Returns:
+          retargeted plan (mapped steps only), per-source-step mapped steps (None if unmapped), unmapped indices
+        """
+        src_modes = {m.mode: m for m in source.modes}
+        dst_modes = {m.mode: m for m in target.modes}
+        warnings: list[str] = []
+        mapped: list[Optional[list[RobotProgramStep]]] = []
+        unmapped: list[int] = []
+
+        for i, step in enumerate(plan.robot_program):
+            out = cls._map_step(step, source, target, src_modes, dst_modes, warnings)
+            mapped.append(out)
+            if out is None:
+                unmapped.append(i)
+
+        new_plan = RobotPlan(
+            robot_program=[s for group in mapped if group for s in group],
+            manual_steps=list(plan.manual_steps),
+            # Source limits don't apply to the target; validation + capacity are re-run by the caller.
+            warnings=[*(w for w in plan.warnings if not _source_specific(w)), *warnings],
+            questions=list(plan.questions),
+            cannot_map=list(plan.cannot_map),
+        )
+        return new_plan, mapped, unmapped
+
+    @classmethod
+    def from_canonical(
+        cls, plan: RobotPlan, target: RobotProfile
+    ) -> tuple[RobotPlan, list[Optional[list[RobotProgramStep]]], list[int]]:
+        """retarget() for a plan built from canonical recipe steps (speeds on CANONICAL_SPEED_SCALES)."""
+        return cls.retarget(plan, _CANONICAL_PROFILE, target)
+
+    @classmethod
+    def _map_step(
+        cls,
+        step: RobotProgramStep,
+        source: RobotProfile,
+        target: RobotProfile,
+        src_modes: dict[str, RobotModeSpec],
+        dst_modes: dict[str, RobotModeSpec],
+        warnings: list[str],
+    ) -> Optional[list[RobotProgramStep]]:
+        step = step.model_copy()
+
+        # Resolve idioms (e.g. SAUTE -> HEAT + temp + stir) to a base mode; the target's own idiom wins.
+        if step.mode not in dst_modes:
+            idiom = _idiom(target, step.mode) or _idiom(source, step.mode)
+            if idiom:
+                step.mode = idiom["mode"]
+                if step.temperature_c is None and idiom.get("temperature_c") is not None:
+                    step.temperature_c = idiom["temperature_c"]
+                if step.speed is None and idiom.get("stir_speed") is not None:
+                    step.speed = idiom["stir_speed"]
+
+        dst = dst_modes.get(step.mode)
+        if dst is None:
+            return None
+        src = src_modes.get(step.mode)
+
+        if step.speed is not None:
+            src_scale = _speed_scale(src) if src else None
+            dst_scale = _speed_scale(dst)
+            if dst_scale is None:
+                step.speed = None
+            elif src_scale is not None:
+                step.speed = _rescale(step.speed, src_scale, dst_scale)
+
+        if step.temperature_c is not None:
+            if dst.temp_c_range is None:
+                step.temperature_c = None
+            else:
+                lo, hi = dst.temp_c_range
+                step.temperature_c = min(max(step.temperature_c, lo), hi)
+
+        if step.attachment:
+            att = cls._map_attachment(step.attachment, target)
+            if att is None:
+                return None
+            step.attachment = att
+
+        # Split long steps instead of silently losing time to the validator's clamp.
+        if dst.max_duration_sec and step.duration_sec > dst.max_duration_sec:
+            chunks: list[RobotProgramStep] = []
+            left = step.duration_sec
+            while left > 0:
+                chunks.append(step.model_copy(update={"duration_sec": min(left, dst.max_duration_sec)}))
+                left -= dst.max_duration_sec
+            warnings.append(
+                f"{step.mode}: {step.duration_sec}s split into {len(chunks)} steps "
+                f"(max {dst.max_duration_sec}s on {target.robot_model})."
+            )
+            return chunks
+        return [step]
+
+    @staticmethod
+    def _map_attachment(name: str, target: RobotProfile) -> Optional[str]:
+        if name in target.attachments:
+            return name
+        role = attachment_role(name)
+        tried: set[str] = set()
+        while role and role not in tried:
+            tried.add(role)
+            for candidate in target.attachments:
+                if candidate in ATTACHMENT_ROLES[role]:
+                    return candidate
+            role = _ROLE_FALLBACK.get(role)
+        return None
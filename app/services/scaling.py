@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Optional
+
+from app.models.schemas import (
+    CanonicalRecipe,
+    Ingredient,
+    LocalizedRecipe,
+    QuantityUnit,
+    RobotPlan,
+    RobotProfile,
+)
+
+# unit -> (dimension, factor to base unit: g for mass, ml for volume)
+_UNITS: dict[QuantityUnit, tuple[str, float]] = {
+    QuantityUnit.g: ("mass", 1.0),
+    QuantityUnit.kg: ("mass", 1000.0),
+    QuantityUnit.ml: ("volume", 1.0),
+    QuantityUnit.l: ("volume", 1000.0),
+    QuantityUnit.tsp: ("volume", 5.0),
+    QuantityUnit.tbsp: ("volume", 15.0),
+}
+
+# Scaling exponent for step durations: time ~ factor ** exp.
+# Heating grows sub-linearly with load; short mechanical steps barely change; resting doesn't.
+_DURATION_EXP: dict[str, float] = {
+    "CHOP": 0.25,
+    "MIX": 0.25,
+    "WHISK": 0.25,
+    "KNEAD": 0.5,
+    "HEAT": 0.5,
+    "STEAM": 0.5,
+    "BOIL": 0.5,
+    "FRY": 0.5,
+    "BAKE": 0.5,
+    "REST": 0.0,
+}
+_DEFAULT_DURATION_EXP = 0.5
+
+CAPACITY_WARNING_PREFIX = "Bowl capacity:"
+
+MAX_SERVINGS = 100
+
+_NUM_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def to_base(qty: float, unit: QuantityUnit) -> Optional[tuple[str, float]]:
+    """(dimension, amount in g/ml) or None for units without a physical conversion (pcs)."""
+    spec = _UNITS.get(unit)
+    if spec is None:
+        return None
+    dim, k = spec
+    return dim, qty * k
+
+
+def _round_sig(x: float, digits: int = 2) -> float:
+    """Round to significant digits: small amounts keep precision instead of rounding to 0."""
+    return float(f"{x:.{digits}g}")
+
+
+def _round_amount(x: float) -> float:
+    return round(x) if x >= 10 else _round_sig(x)
+
+
+def _round_spoons(x: float) -> float:
+    """Nearest 1/8 spoon; amounts below 1/16 keep significant digits."""
+    eighths = round(x * 8) / 8
+    return eighths if eighths > 0 else _round_sig(x)
+
+
+def normalize_quantity(qty: float, unit: QuantityUnit) -> tuple[float, QuantityUnit]:
+    """
+    Pick a human-friendly unit within the same dimension and round sensibly.
+
+    A non-zero amount never rounds to 0.
+    """
+    if unit == QuantityUnit.pcs:
+        return max(round(qty * 2) / 2, 0.5), unit  # halves of an egg are the finest we suggest
+
+    dim, base = to_base(qty, unit)  # type: ignore[misc]
+    if dim == "mass":
+        if base >= 1000:
+            return round(base / 1000, 2), QuantityUnit.kg
+        return _round_amount(base), QuantityUnit.g
+
+    # volume: spoons for small amounts (down to 1/8 tsp), ml/l otherwise
+    if unit in (QuantityUnit.tsp, QuantityUnit.tbsp) and base < 60:
+        if base >= 15 and (base / 15) * 2 == round((base / 15) * 2):
+            return base / 15, QuantityUnit.tbsp
+        tsp = round(base / 5 * 8) / 8
+        if tsp > 0:
+            return tsp, QuantityUnit.tsp
+    if base >= 1000:
+        return round(base / 1000, 2), QuantityUnit.l
+    return _round_amount(base), QuantityUnit.ml
+
+
+def scale_ingredient(ing: Ingredient, factor: float) -> Ingredient:
+    if ing.qty is None:
+        return ing.model_copy()
+    if ing.unit is None:
+        return ing.model_copy(update={"qty": round(ing.qty * factor, 2) or _round_sig(ing.qty * factor)})
+    qty, unit = normalize_quantity(ing.qty * factor, ing.unit)
+    return ing.model_copy(update={"qty": qty, "unit": unit})
+
+
+def scale_duration(duration_sec: int, action: Optional[str], factor: float) -> int:
+    exp = _DURATION_EXP.get(action or "", _DEFAULT_DURATION_EXP)
+    return int(round(duration_sec * factor**exp))
+
+
+def scale_recipe(recipe: CanonicalRecipe, servings: int) -> Optional[CanonicalRecipe]:
+    """Rescale a recipe to `servings`. None when the base servings are unknown or `servings` is out of range."""
+    if not recipe.servings or not 1 <= servings <= MAX_SERVINGS:
+        return None
+    factor = servings / recipe.servings
+    steps = [
+        s.model_copy(update={"duration_sec": scale_duration(s.duration_sec, s.action_type, factor)})
+        if s.duration_sec is not None
+        else s.model_copy()
+        for s in recipe.steps
+    ]
+    return recipe.model_copy(update={
+        "servings": servings,
+        "ingredients": [scale_ingredient(i, factor) for i in recipe.ingredients],
+        "steps": steps,
+    })
+
+
+def scale_plan(plan: RobotPlan, factor: float) -> RobotPlan:
+    """Rescale robot step durations; limits are re-applied by RobotPlanValidator afterwards."""
+    program = [
+        s.model_copy(update={"duration_sec": scale_duration(s.duration_sec, s.mode, factor)})
+        for s in plan.robot_program
+    ]
+    return plan.model_copy(update={
+        "robot_program": program,
+        "warnings": [w for w in plan.warnings if not w.startswith(CAPACITY_WARNING_PREFIX)],
+        "manual_steps": list(plan.manual_steps),
+        "questions": list(plan.questions),
+        "cannot_map": list(plan.cannot_map),
+    })
+
+
+def capacity_warnings(recipe: CanonicalRecipe, profile: RobotProfile) -> list[str]:
+    """
+    Compare total ingredient load with bowl limits.
+
+    Liquids count towards both volume and mass (density ~1); pcs are ignored.
+    """
+    volume_ml = 0.0
+    mass_g = 0.0
+    for ing in recipe.ingredients:
+        if ing.qty is None or ing.unit is None:
+            continue
+        conv = to_base(ing.qty, ing.unit)
+        if conv is None:
+            continue
+        dim, amount = conv
+        if dim == "volume":
+            volume_ml += amount
+        mass_g += amount
+
+    out: list[str] = []
+    if volume_ml > profile.bowl_max_fill_ml:
+        out.append(
+            f"{CAPACITY_WARNING_PREFIX} liquids {volume_ml:.0f} ml > max fill {profile.bowl_max_fill_ml} ml; "
+            "cook in batches."
+        )
+    if mass_g > profile.bowl_max_mass_g:
+        out.append(
+            f"{CAPACITY_WARNING_PREFIX} load {mass_g:.0f} g > max {profile.bowl_max_mass_g} g; cook in batches."
+        )
+    return out
+
+
+def _parse_servings(raw: Any) -> Optional[int]:
+    if isinstance(raw, bool):
+        return None
+    if isinstance(raw, int) or (isinstance(raw, float) and raw.is_integer()):
+        return int(raw)
+    if isinstance(raw, str) and raw.strip().isascii() and raw.strip().isdigit():
+        digits = raw.strip().lstrip("0") or "0"
+        return int(digits) if len(digits) <= 9 else MAX_SERVINGS + 1  # don't parse huge digit strings
+    return None
+
+
+def servings_answer(answers: dict[str, Any]) -> Optional[int]:
+    """Parse a servings answer ({"servings": 4} or "4"); None if absent or not an integer in 1..MAX_SERVINGS."""
+    n = _parse_servings(answers.get("servings"))
+    return n if n is not None and 1 <= n <= MAX_SERVINGS else None
+
+
+def servings_out_of_range(answers: dict[str, Any]) -> bool:
+    """True for an integer servings answer above MAX_SERVINGS (callers reject it)."""
+    n = _parse_servings(answers.get("servings"))
+    return n is not None and n > MAX_SERVINGS
+
+
+def is_servings_question(q: dict[str, Any]) -> bool:
+    return q.get("id") == "servings"
+
+
+def rescale_localized_lines(
+    localized: LocalizedRecipe,
+    before: CanonicalRecipe,
+    after: CanonicalRecipe,
+) -> Optional[LocalizedRecipe]:
+    """
+    Patch quantities inside already-translated ingredient lines.
+
+    When normalization switched units (3 tsp -> 1 tbsp) the line keeps its translated unit
+    and gets the equivalent amount in it. Returns None only when a line doesn't carry the
+    old quantity; the caller then re-localizes.
+    """
+    if len(localized.ingredients) != len(before.ingredients):
+        return None
+    lines: list[str] = []
+    for line, old, new in zip(localized.ingredients, before.ingredients, after.ingredients):
+        if old.qty is None or new.qty is None or (old.qty == new.qty and old.unit == new.unit):
+            lines.append(line)
+            continue
+        new_qty = new.qty
+        if old.unit != new.unit:
+            unit_old = to_base(1.0, old.unit) if old.unit is not None else None
+            amount_new = to_base(new.qty, new.unit) if new.unit is not None else None
+            if unit_old is None or amount_new is None:
+                return None
+            in_old_unit = amount_new[1] / unit_old[1]
+            spoons = old.unit in (QuantityUnit.tsp, QuantityUnit.tbsp)
+            new_qty = _round_spoons(in_old_unit) if spoons else _round_amount(in_old_unit)
+        patched = _replace_number(line, old.qty, new_qty)
+        if patched is None:
+            return None
+        lines.append(patched)
+    return localized.model_copy(update={"ingredients": lines})
+
+
+def _replace_number(line: str, old: float, new: float) -> Optional[str]:
+    for m in _NUM_RE.finditer(line):
+        if float(m.group().replace(",", ".")) == old:
+            txt = f"{new:g}"
+            if "," in m.group():
+                txt = txt.replace(".", ",")
+            return line[: m.start()] + txt + line[m.end():]
+    return None
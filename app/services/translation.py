@@ -1,17 +1,24 @@
 from __future__ import annotations
 
-import json
+import functools
 from typing import Optional
 
 from pydantic import BaseModel
 
+from app.core.serialization import content_hash
+from app.core.tracing import span
 from app.models.schemas import CanonicalRecipe, LocalizedRecipe
 from app.services.prompts import prompt_localize
-from app.xai.client import XAIClient
+from app.storage.cache import Cache
+from app.xai.router import TASK_TRANSLATE, ModelRouter
 
+# Bump when prompt_localize or LocalizedRecipe changes: invalidates cached translations and catalog versions.
+TRANSLATION_VERSION = "1"
 
+
+@functools.lru_cache(maxsize=None)
 def pydantic_to_response_format(schema_model: type[BaseModel]) -> dict:
-    # OpenAI-style json_schema response_format
+    # OpenAI-style json_schema response_format; built once per model (shared dict, don't mutate)
     return {
         "type": "json_schema",
         "json_schema": {
@@ -23,12 +30,16 @@ def pydantic_to_response_format(schema_model: type[BaseModel]) -> dict:
 
 
 class TranslationService:
-    def __init__(self, xai: XAIClient, model: str, store: bool = False):
-        self.xai = xai
-        self.model = model
+    def __init__(self, router: ModelRouter, store: bool = False, cache: Optional[Cache] = None):
+        self.router = router
         self.store = store
+        self.cache = cache
 
     async def localize(self, recipe: CanonicalRecipe, lang: str) -> LocalizedRecipe:
+        with span("localize", lang=lang):
+            return await self._localize(recipe, lang)
+
+    async def _localize(self, recipe: CanonicalRecipe, lang: str) -> LocalizedRecipe:
         if lang.lower().startswith("ru"):
             return LocalizedRecipe(
                 title=recipe.title,
@@ -36,19 +47,29 @@ class TranslationService:
                 steps=[s.text for s in recipe.steps],
             )
 
+        # Translation cache: (recipe content, lang, translation version)
+        key = Cache._key("l10n", [content_hash(recipe), lang.lower(), TRANSLATION_VERSION])
+        if self.cache is not None:
+            cached = await self.cache.get_model(key, LocalizedRecipe)
+            if cached is not None:
+                return cached
+
         sys, usr = prompt_localize(lang)
         messages = [
             {"role": "system", "content": sys},
-            {"role": "user", "content": usr + "\n\n" + recipe.model_dump_json(ensure_ascii=False)},
+            {"role": "user", "content": usr + "\n\n" + recipe.model_dump_json()},
         ]
-        resp = await self.xai.create_response(
-            model=self.model,
+        resp = await self.router.create_response(
+            task=TASK_TRANSLATE,
             input_messages=messages,
             response_format=pydantic_to_response_format(LocalizedRecipe),
             store=self.store,
         )
-        text = self.xai.extract_output_text(resp)
-        return LocalizedRecipe.model_validate_json(text)
+        text = self.router.extract_output_text(resp)
+        localized = LocalizedRecipe.model_validate_json(text)
+        if self.cache is not None:
+            await self.cache.set_model(key, localized)
+        return localized
 
     @staticmethod
     def _fmt_ing(i) -> str:
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Protocol
+
+from cachetools import TLRUCache
+
+
+class StateBackend(Protocol):
+    """
+    Key/value byte store shared by cache, session and idempotency state.
+
+    Values are opaque bytes; callers own serialization. ttl_s=None means no expiry.
+    Only `cache:` keys may be evicted before their TTL (size bound: CACHE_MAXSIZE for
+    memory/sqlite, the server's maxmemory policy for redis); sessions and idempotency
+    records live until they expire or are deleted.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+    async def add(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> bool:
+        """Atomically set `key` only if it is absent (or expired); True if this call stored it."""
+        ...
+
+    async def incr(self, key: str, amount: float, ttl_s: Optional[int] = None) -> float:
+        """Atomically add `amount` to a numeric counter (absent = 0); returns the new total.
+
+        The counter expires `ttl_s` after the last increment.
+        """
+        ...
+
+
+class MemoryBackend:
+    """
+    Per-process store (single worker / dev). Not shared between uvicorn workers.
+
+    `cache:` keys go to a size-bounded TLRU (`maxsize`); everything else (sessions,
+    idempotency claims/responses) is TTL-only, so cache traffic can never evict it.
+    Expired state entries are dropped on read and purged periodically.
+    """
+
+    _PURGE_EVERY = 500  # state writes
+
+    def __init__(self, maxsize: int = 10_000):
+        self._cache: TLRUCache = TLRUCache(maxsize=maxsize, ttu=lambda _k, v, now: now + v[0])
+        self._state: dict[str, tuple[float, bytes]] = {}  # key -> (expires_at monotonic, value)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @staticmethod
+    def _evictable(key: str) -> bool:
+        return key.startswith("cache:")
+
+    def _get(self, key: str) -> Optional[bytes]:
+        if self._evictable(key):
+            item = self._cache.get(key)
+            return item[1] if item is not None else None
+        item = self._state.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._state[key]
+            return None
+        return item[1]
+
+    def _set(self, key: str, value: bytes, ttl_s: Optional[int]) -> None:
+        if self._evictable(key):
+            self._cache[key] = (float("inf") if ttl_s is None else ttl_s, value)
+            return
+        now = time.monotonic()
+        self._state[key] = (float("inf") if ttl_s is None else now + ttl_s, value)
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            for k in [k for k, (exp, _) in self._state.items() if exp <= now]:
+                del self._state[k]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get(key)
+
+    async def set(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> None:
+        with self._lock:
+            self._set(key, value, ttl_s)
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+            self._state.pop(key, None)
+
+    async def add(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._set(key, value, ttl_s)
+            return True
+
+    async def incr(self, key: str, amount: float, ttl_s: Optional[int] = None) -> float:
+        with self._lock:
+            current = self._get(key)
+            total = (float(current) if current is not None else 0.0) + amount
+            self._set(key, repr(total).encode(), ttl_s)
+            return total
+
+
+class SQLiteBackend:
+    """
+    Shared local store for multi-worker deployments on one host.
+
+    WAL mode lets all workers read concurrently while one writes; each process opens
+    its own connection. Expired rows are ignored on read and purged periodically; the
+    same purge trims `cache:` rows soonest to expire down to `maxsize` (so the bound
+    may be overshot by up to _PURGE_EVERY writes). Statements on the local file take
+    microseconds and run inline.
+    """
+
+    _PURGE_EVERY = 500  # writes
+
+    def __init__(self, path: str, maxsize: int = 10_000):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _purge(self) -> None:
+        self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        # key range instead of LIKE so the primary-key index is used
+        (cached,) = self._conn.execute("SELECT COUNT(*) FROM kv WHERE key >= 'cache:' AND key < 'cache;'").fetchone()
+        if cached > self._maxsize:
+            self._conn.execute(
+                "DELETE FROM kv WHERE key IN (SELECT key FROM kv WHERE key >= 'cache:' AND key < 'cache;' "
+                "ORDER BY expires_at IS NULL, expires_at LIMIT ?)",
+                (cached - self._maxsize,),
+            )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    async def set(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> None:
+        expires_at = None if ttl_s is None else time.time() + ttl_s
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % self._PURGE_EVERY == 0:
+                self._purge()
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    async def add(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> bool:
+        now = time.time()
+        expires_at = None if ttl_s is None else now + ttl_s
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+                (key, value, expires_at, now),
+            )
+            return cur.rowcount == 1
+
+    async def incr(self, key: str, amount: float, ttl_s: Optional[int] = None) -> float:
+        now = time.time()
+        expires_at = None if ttl_s is None else now + ttl_s
+        with self._lock:
+            row = self._conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at, value = CASE "
+                "WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? THEN excluded.value "
+                "ELSE CAST(CAST(kv.value AS REAL) + CAST(excluded.value AS REAL) AS BLOB) "
+                "END RETURNING value",
+                (key, repr(float(amount)).encode(), expires_at, now),
+            ).fetchone()
+        return float(row[0])
+
+
+class RedisBackend:
+    """
+    Redis-protocol store for multi-host deployments (optional `redis` package, asyncio client).
+
+    `client` may be any object with redis.asyncio's get/set(ex=, nx=)/delete/incrbyfloat/expire
+    API (e.g. fakeredis.aioredis), which keeps it testable offline.
+    """
+
+    def __init__(self, url: str = "", *, client: Any = None, prefix: str = "kr:"):
+        if client is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:  # pragma: no cover - depends on optional dependency
+                raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+            client = aioredis.Redis.from_url(url)
+        self._r = client
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._r.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> None:
+        await self._r.set(self._prefix + key, value, ex=ttl_s)
+
+    async def delete(self, key: str) -> None:
+        await self._r.delete(self._prefix + key)
+
+    async def add(self, key: str, value: bytes, ttl_s: Optional[int] = None) -> bool:
+        return bool(await self._r.set(self._prefix + key, value, ex=ttl_s, nx=True))
+
+    async def incr(self, key: str, amount: float, ttl_s: Optional[int] = None) -> float:
+        total = float(await self._r.incrbyfloat(self._prefix + key, amount))
+        if ttl_s is not None:
+            await self._r.expire(self._prefix + key, ttl_s)
+        return total
+
+
+def create_backend(kind: str, *, maxsize: int, sqlite_path: str, redis_url: str) -> StateBackend:
+    kind = kind.strip().lower()
+    if kind == "memory":
+        return MemoryBackend(maxsize=maxsize)
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path, maxsize=maxsize)
+    if kind == "redis":
+        return RedisBackend(redis_url)
+    raise ValueError(f"Unknown STATE_BACKEND '{kind}' (expected memory|sqlite|redis)")
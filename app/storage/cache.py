@@ -2,14 +2,24 @@ from __future__ import annotations
 
 import hashlib
 import json
-from typing import Any, Optional
+from typing import Any, Optional, TypeVar
 
-from cachetools import TTLCache
+import orjson
+from pydantic import BaseModel
+
+from app.core.serialization import dumps
+from app.core.tracing import span
+from app.storage.backends import MemoryBackend, StateBackend
+
+M = TypeVar("M", bound=BaseModel)
 
 
 class Cache:
-    def __init__(self, ttl_s: int, maxsize: int):
-        self._cache = TTLCache(maxsize=maxsize, ttl=ttl_s)
+    """TTL cache over a StateBackend; values are stored as JSON so any worker can read them."""
+
+    def __init__(self, ttl_s: int, maxsize: int, backend: Optional[StateBackend] = None):
+        self.ttl_s = ttl_s
+        self._backend = backend if backend is not None else MemoryBackend(maxsize=maxsize)
 
     @staticmethod
     def _key(prefix: str, payload: Any) -> str:
@@ -17,8 +27,22 @@ class Cache:
         h = hashlib.sha256(raw).hexdigest()
         return f"{prefix}:{h}"
 
-    def get(self, key: str) -> Optional[Any]:
-        return self._cache.get(key)
+    async def get(self, key: str) -> Optional[Any]:
+        with span("cache", op="get") as s:
+            raw = await self._backend.get(f"cache:{key}")
+            if s is not None:
+                s.attrs["hit"] = raw is not None
+        return orjson.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any) -> None:
+        await self._backend.set(f"cache:{key}", dumps(value), self.ttl_s)
+
+    async def get_model(self, key: str, model: type[M]) -> Optional[M]:
+        with span("cache", op="get") as s:
+            raw = await self._backend.get(f"cache:{key}")
+            if s is not None:
+                s.attrs["hit"] = raw is not None
+        return model.model_validate_json(raw) if raw is not None else None
 
-    def set(self, key: str, value: Any) -> None:
-        self._cache[key] = value
+    async def set_model(self, key: str, value: BaseModel) -> None:
+        await self._backend.set(f"cache:{key}", value.__pydantic_serializer__.to_json(value), self.ttl_s)
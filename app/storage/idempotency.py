@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Awaitable, Callable
+
+from app.storage.backends import StateBackend
+
+# Record layout in the backend: 1-byte state + 64-char body fingerprint [+ response bytes].
+_PENDING = b"P"
+_DONE = b"D"
+_FP_LEN = 64
+
+logger = logging.getLogger("app.idempotency")
+
+
+class IdempotencyConflict(Exception):
+    """Key was already used with a different request body."""
+
+
+class IdempotencyInProgress(Exception):
+    """Another worker is still computing this key and didn't finish within the wait budget."""
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key handling for expensive POSTs.
+
+    The first request for a key claims it (atomic add) and computes; duplicates in the
+    same process attach to the running future, duplicates on other workers poll the
+    shared backend until the stored response appears. Failures release the key so a
+    retry recomputes. Backend writes after compute are best-effort: a storage error is
+    logged and never leaves same-process duplicates waiting on an unresolved future.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        *,
+        ttl_s: int,
+        pending_ttl_s: int,
+        wait_s: float,
+        poll_s: float = 0.25,
+    ):
+        self._backend = backend
+        self.ttl_s = ttl_s
+        self.pending_ttl_s = pending_ttl_s
+        self.wait_s = wait_s
+        self.poll_s = poll_s
+        self._inflight: dict[str, tuple[str, asyncio.Future[bytes]]] = {}
+
+    @staticmethod
+    def fingerprint(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        body: bytes,
+        compute: Callable[[], Awaitable[bytes]],
+    ) -> tuple[bytes, bool]:
+        """
+        Returns:
+          response bytes, replayed (True if served from a previous/running computation)
+        """
+        rec_key = f"idem:{scope}:{key}"
+        fp = self.fingerprint(body)
+        deadline = time.monotonic() + self.wait_s
+
+        while True:
+            local = self._inflight.get(rec_key)
+            if local is not None:
+                if local[0] != fp:
+                    raise IdempotencyConflict(key)
+                try:
+                    return await asyncio.shield(local[1]), True
+                except asyncio.CancelledError:
+                    if not local[1].cancelled():
+                        raise  # we were cancelled ourselves
+                    continue  # owner request was cancelled; the key is free again
+
+            if await self._backend.add(rec_key, _PENDING + fp.encode(), self.pending_ttl_s):
+                return await self._compute(rec_key, fp, compute), False
+
+            raw = await self._backend.get(rec_key)
+            if raw is None:
+                continue  # expired or released between add() and get(); try to claim again
+            if raw[1 : 1 + _FP_LEN].decode() != fp:
+                raise IdempotencyConflict(key)
+            if raw[:1] == _DONE:
+                return raw[1 + _FP_LEN :], True
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(key)
+            await asyncio.sleep(self.poll_s)
+
+    async def _release(self, rec_key: str) -> None:
+        try:
+            await self._backend.delete(rec_key)
+        except Exception:
+            logger.exception("idempotency release failed key=%s; claim expires in %ss", rec_key, self.pending_ttl_s)
+
+    async def _compute(self, rec_key: str, fp: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        fut: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+        self._inflight[rec_key] = (fp, fut)
+        try:
+            body = await compute()
+        except asyncio.CancelledError:
+            fut.cancel()
+            await self._release(rec_key)
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved: nobody may be waiting
+            await self._release(rec_key)
+            raise
+        else:
+            fut.set_result(body)
+            try:
+                await self._backend.set(rec_key, _DONE + fp.encode() + body, self.ttl_s)
+            except Exception:
+                logger.exception("idempotency store failed key=%s; releasing claim", rec_key)
+                await self._release(rec_key)
+            return body
+        finally:
+            self._inflight.pop(rec_key, None)
+            if not fut.done():
+                fut.cancel()  # waiters retry and claim the key themselves
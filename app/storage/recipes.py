@@ -1,39 +1,99 @@
 from __future__ import annotations
 
-import json
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Optional
 
+import orjson
+
+from app.core.serialization import content_hash, fragment
+from app.core.tracing import span
 from app.models.schemas import CanonicalRecipe
 
 
+@dataclass(frozen=True)
+class _Entry:
+    mtime_ns: int
+    recipe: CanonicalRecipe
+    fragment: orjson.Fragment
+    content_hash: str
+    meta: dict[str, Any]
+
+
 class RecipeRepo:
     def __init__(self, recipes_dir: str):
         self.recipes_dir = Path(recipes_dir)
+        # recipe_id -> parsed recipe + pre-serialized JSON; invalidated by file mtime.
+        self._entries: dict[str, _Entry] = {}
+
+    def _load(self, p: Path) -> Optional[_Entry]:
+        try:
+            mtime_ns = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._entries.pop(p.stem, None)
+            return None
+        entry = self._entries.get(p.stem)
+        if entry is not None and entry.mtime_ns == mtime_ns:
+            return entry
+
+        recipe = CanonicalRecipe.model_validate_json(p.read_bytes())
+        entry = _Entry(
+            mtime_ns=mtime_ns,
+            recipe=recipe,
+            fragment=fragment(recipe),
+            content_hash=content_hash(recipe),
+            meta={
+                "id": p.stem,
+                "title": recipe.title,
+                "tags": recipe.tags,
+                "prep_min": recipe.prep_min,
+                "cook_min": recipe.cook_min,
+            },
+        )
+        self._entries[p.stem] = entry
+        return entry
 
     def list_meta(self) -> list[dict[str, Any]]:
         out: list[dict[str, Any]] = []
-        for p in sorted(self.recipes_dir.glob("*.json")):
-            try:
-                data = json.loads(p.read_text(encoding="utf-8"))
-                out.append({
-                    "id": p.stem,
-                    "title": data.get("title", ""),
-                    "tags": data.get("tags", []),
-                    "prep_min": data.get("prep_min"),
-                    "cook_min": data.get("cook_min"),
-                })
-            except Exception:
-                continue
+        with span("repo", op="list_recipes"):
+            for p in sorted(self.recipes_dir.glob("*.json")):
+                try:
+                    entry = self._load(p)
+                except Exception:
+                    continue
+                if entry is not None:
+                    out.append(entry.meta)
         return out
 
     def get(self, recipe_id: str) -> Optional[CanonicalRecipe]:
-        p = self.recipes_dir / f"{recipe_id}.json"
-        if not p.exists():
-            return None
-        data = json.loads(p.read_text(encoding="utf-8"))
-        return CanonicalRecipe.model_validate(data)
+        with span("repo", op="get_recipe"):
+            entry = self._load(self.recipes_dir / f"{recipe_id}.json")
+        return entry.recipe if entry else None
+
+    def get_fragment(self, recipe_id: str) -> Optional[orjson.Fragment]:
+        """Canonical recipe as cached JSON bytes, ready to embed into a response."""
+        with span("repo", op="get_recipe"):
+            entry = self._load(self.recipes_dir / f"{recipe_id}.json")
+        return entry.fragment if entry else None
+
+    def content_hashes(self) -> dict[str, str]:
+        """recipe_id -> content hash for every valid recipe (cheap: stat + cached entries)."""
+        out: dict[str, str] = {}
+        with span("repo", op="hash_recipes"):
+            for p in sorted(self.recipes_dir.glob("*.json")):
+                try:
+                    entry = self._load(p)
+                except Exception:
+                    continue
+                if entry is not None:
+                    out[p.stem] = entry.content_hash
+        return out
+
+    def content_hash(self, recipe_id: str) -> Optional[str]:
+        entry = self._load(self.recipes_dir / f"{recipe_id}.json")
+        return entry.content_hash if entry else None
 
     def save(self, recipe_id: str, recipe: CanonicalRecipe) -> None:
         p = self.recipes_dir / f"{recipe_id}.json"
-        p.write_text(recipe.model_dump_json(indent=2, ensure_ascii=False), encoding="utf-8")
+        p.write_text(recipe.model_dump_json(indent=2), encoding="utf-8")
+        self._entries.pop(recipe_id, None)
@@ -1,19 +1,35 @@
 from __future__ import annotations
 
-import json
 from pathlib import Path
 from typing import Optional
 
+from app.core.tracing import span
 from app.models.schemas import RobotProfile
 
 
 class RobotProfileRepo:
     def __init__(self, profiles_dir: str):
         self.profiles_dir = Path(profiles_dir)
+        # robot_model -> (mtime_ns, profile); profiles are read on every generate call.
+        self._entries: dict[str, tuple[int, RobotProfile]] = {}
+
+    def list_models(self) -> list[str]:
+        return [p.stem for p in sorted(self.profiles_dir.glob("*.json"))]
 
     def get(self, robot_model: str) -> Optional[RobotProfile]:
+        with span("repo", op="get_profile"):
+            return self._get(robot_model)
+
+    def _get(self, robot_model: str) -> Optional[RobotProfile]:
         p = self.profiles_dir / f"{robot_model}.json"
-        if not p.exists():
+        try:
+            mtime_ns = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._entries.pop(robot_model, None)
             return None
-        data = json.loads(p.read_text(encoding="utf-8"))
-        return RobotProfile.model_validate(data)
+        cached = self._entries.get(robot_model)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        profile = RobotProfile.model_validate_json(p.read_bytes())
+        self._entries[robot_model] = (mtime_ns, profile)
+        return profile
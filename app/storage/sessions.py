@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from app.core.tracing import span
+from app.models.schemas import SessionState
+from app.storage.backends import StateBackend
+
+
+class SessionStore:
+    """
+    Generate/continue sessions kept in a StateBackend.
+
+    With a shared backend (sqlite/redis) a /continue can land on any worker.
+    """
+
+    def __init__(self, backend: StateBackend, ttl_s: int):
+        self._backend = backend
+        self.ttl_s = ttl_s
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        with span("session", op="get"):
+            raw = await self._backend.get(f"session:{session_id}")
+        return SessionState.model_validate_json(raw) if raw is not None else None
+
+    async def save(self, session_id: str, state: SessionState) -> None:
+        with span("session", op="save"):
+            await self._backend.set(f"session:{session_id}", state.__pydantic_serializer__.to_json(state), self.ttl_s)
@@ -1,11 +1,26 @@
 from __future__ import annotations
 
+import re
+
+from app.core.tracing import span
 from app.models.schemas import RobotPlan, RobotProfile
 
+# Matches the warnings emitted below; they describe one profile and are dropped when a plan is retargeted.
+_PROFILE_WARNING_RE = re.compile(r"^(Mode '|Attachment '|\w+: (duration|speed|temp) )")
+
+
+def is_profile_warning(warning: str) -> bool:
+    return bool(_PROFILE_WARNING_RE.match(warning))
+
 
 class RobotPlanValidator:
     @staticmethod
     def validate(plan: RobotPlan, profile: RobotProfile) -> RobotPlan:
+        with span("validate", robot_model=profile.robot_model):
+            return RobotPlanValidator._validate(plan, profile)
+
+    @staticmethod
+    def _validate(plan: RobotPlan, profile: RobotProfile) -> RobotPlan:
         # Hard validation: clamp values into allowed ranges and add warnings.
         mode_index = {m.mode: m for m in profile.modes}
         for s in plan.robot_program:
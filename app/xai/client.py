@@ -5,6 +5,8 @@ from typing import Any, Optional
 
 import httpx
 
+from app.core.tracing import span
+
 logger = logging.getLogger("xai.client")
 
 
@@ -13,6 +15,18 @@ class XAIClient:
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.timeout = timeout_s
+        # Shared connection pool (keep-alive/TLS reuse across calls) once open() ran in the
+        # serving event loop; until then every call uses a short-lived client.
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def open(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     def _headers(self) -> dict[str, str]:
         return {
@@ -47,8 +61,12 @@ class XAIClient:
             payload["max_output_tokens"] = max_output_tokens
 
         url = f"{self.base_url}/v1/responses"
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            r = await client.post(url, headers=self._headers(), json=payload)
+        with span("xai", model=model):
+            if self._client is not None:
+                r = await self._client.post(url, headers=self._headers(), json=payload)
+            else:
+                async with httpx.AsyncClient(timeout=self.timeout) as client:
+                    r = await client.post(url, headers=self._headers(), json=payload)
             if r.status_code >= 400:
                 logger.error("xAI error %s: %s", r.status_code, r.text[:2000])
                 r.raise_for_status()
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Optional
+
+import httpx
+
+from app.core.tracing import span
+from app.xai.client import XAIClient
+from app.xai.usage import UsageMeter
+
+logger = logging.getLogger("xai.router")
+
+# Task classes routed by ModelRouter.
+TASK_EXTRACT = "extract"  # web_search + structured extraction (tooling model only)
+TASK_ADAPT = "adapt"
+TASK_REPLAN = "replan"
+TASK_TRANSLATE = "translate"
+
+
+class _ModelStats:
+    __slots__ = ("window", "calls", "errors", "consecutive_failures", "cooldown_until")
+
+    def __init__(self, window: int):
+        self.window: deque[tuple[float, bool]] = deque(maxlen=window)  # (latency_ms, ok)
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record(self, latency_ms: float, ok: bool) -> None:
+        self.window.append((latency_ms, ok))
+        self.calls += 1
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.errors += 1
+            self.consecutive_failures += 1
+
+    def error_rate(self) -> float:
+        if not self.window:
+            return 0.0
+        return sum(1 for _, ok in self.window if not ok) / len(self.window)
+
+    def latency_pct(self, q: float) -> Optional[float]:
+        lat = sorted(ms for ms, ok in self.window if ok)
+        if not lat:
+            return None
+        return lat[min(int(q * len(lat)), len(lat) - 1)]
+
+
+class ModelRouter:
+    """
+    Picks the model per task class and fails over between models.
+
+    Routes are ordered candidate lists per task and payload size class ("small"/"large").
+    A model that degrades (consecutive failures, windowed error rate, or rolling p50
+    latency over `slow_ms`) is moved to the back for `cooldown_s`; retryable errors
+    (timeouts, transport errors, 429, 5xx) fail over to the next candidate.
+    """
+
+    def __init__(
+        self,
+        xai: XAIClient,
+        routes: dict[str, dict[str, list[str]]],
+        *,
+        small_payload_chars: int = 6000,
+        slow_ms: float = 30_000.0,
+        window: int = 50,
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 4,
+        max_consecutive_failures: int = 3,
+        cooldown_s: float = 30.0,
+        usage: Optional[UsageMeter] = None,
+    ):
+        self.xai = xai
+        self.usage = usage
+        self.routes = routes
+        self.small_payload_chars = small_payload_chars
+        self.slow_ms = slow_ms
+        self.window = window
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown_s = cooldown_s
+        self._stats: dict[str, _ModelStats] = {}
+        self._decisions: Counter[tuple[str, str, str]] = Counter()  # (task, size, model)
+        self._failovers: Counter[str] = Counter()
+
+    def _model_stats(self, model: str) -> _ModelStats:
+        st = self._stats.get(model)
+        if st is None:
+            st = self._stats[model] = _ModelStats(self.window)
+        return st
+
+    def degraded(self, model: str) -> bool:
+        st = self._stats.get(model)
+        return st is not None and st.cooldown_until > time.monotonic()
+
+    def _record(self, model: str, st: _ModelStats, latency_ms: float, ok: bool) -> None:
+        st.record(latency_ms, ok)
+        # Degraded models cool down and are probed again afterwards: a successful probe clears
+        # the cooldown unless the model is still slow, a failing one restarts it.
+        p50 = st.latency_pct(0.5)
+        if ok:
+            degraded = p50 is not None and p50 > self.slow_ms
+        else:
+            degraded = st.consecutive_failures >= self.max_consecutive_failures or (
+                len(st.window) >= self.min_samples and st.error_rate() >= self.error_rate_threshold
+            )
+        if not degraded:
+            if ok:
+                st.cooldown_until = 0.0
+            return
+        if not self.degraded(model):
+            logger.warning("model degraded model=%s error_rate=%.2f p50_ms=%s", model, st.error_rate(), p50)
+        st.cooldown_until = time.monotonic() + self.cooldown_s
+
+    def candidates(self, task: str, payload_chars: int) -> tuple[str, list[str]]:
+        size = "small" if payload_chars <= self.small_payload_chars else "large"
+        route = self.routes[task]
+        ordered = list(dict.fromkeys(route.get(size) or route.get("large") or route.get("small") or []))
+        healthy = [m for m in ordered if not self.degraded(m)]
+        return size, healthy + [m for m in ordered if m not in healthy]
+
+    async def create_response(
+        self,
+        *,
+        task: str,
+        input_messages: list[dict[str, Any]],
+        max_output_tokens: Optional[int] = None,
+        **kwargs: Any,
+    ) -> dict[str, Any]:
+        """XAIClient.create_response with the model chosen by the router (same kwargs, minus `model`)."""
+        if self.usage is not None:
+            await self.usage.check_budget()
+        payload_chars = sum(len(str(m.get("content", ""))) for m in input_messages)
+        size, models = self.candidates(task, payload_chars)
+        last_exc: Optional[BaseException] = None
+        for i, model in enumerate(models):
+            if i:
+                self._failovers[task] += 1
+                logger.warning("failover task=%s from=%s to=%s: %s", task, models[i - 1], model, last_exc)
+            self._decisions[(task, size, model)] += 1
+            st = self._model_stats(model)
+            t0 = time.perf_counter()
+            try:
+                with span("route", task=task, model=model, size=size):
+                    resp = await self._call(task, model, input_messages, max_output_tokens, kwargs)
+            except Exception as e:
+                self._record(model, st, (time.perf_counter() - t0) * 1000.0, ok=False)
+                if not self._retryable(e):
+                    raise
+                last_exc = e
+                continue
+            self._record(model, st, (time.perf_counter() - t0) * 1000.0, ok=True)
+            return resp
+        assert last_exc is not None, f"no models routed for task '{task}'"
+        raise last_exc
+
+    async def _call(
+        self,
+        task: str,
+        model: str,
+        input_messages: list[dict[str, Any]],
+        max_output_tokens: Optional[int],
+        kwargs: dict[str, Any],
+    ) -> dict[str, Any]:
+        budget = max_output_tokens
+        if self.usage is not None and max_output_tokens is not None:
+            budget = self.usage.output_budget(task, model, max_output_tokens)
+        resp = await self.xai.create_response(
+            model=model, input_messages=input_messages, max_output_tokens=budget, **kwargs
+        )
+        if self.usage is None:
+            return resp
+        await self.usage.record(task, model, resp.get("usage"))
+        if budget != max_output_tokens and self.usage.truncated(resp):
+            # Learned budget was too tight for this one: retry with the caller's default.
+            logger.warning("truncated task=%s model=%s max_output_tokens=%s; retrying", task, model, budget)
+            self.usage.reset_output_budget(task, model)
+            resp = await self.xai.create_response(
+                model=model, input_messages=input_messages, max_output_tokens=max_output_tokens, **kwargs
+            )
+            await self.usage.record(task, model, resp.get("usage"))
+        return resp
+
+    @staticmethod
+    def extract_output_text(resp: dict[str, Any]) -> str:
+        return XAIClient.extract_output_text(resp)
+
+    @staticmethod
+    def _retryable(e: Exception) -> bool:
+        if isinstance(e, httpx.HTTPStatusError):
+            return e.response.status_code == 429 or e.response.status_code >= 500
+        return isinstance(e, (httpx.TimeoutException, httpx.TransportError))
+
+    def snapshot(self) -> dict[str, Any]:
+        models = {}
+        for model, st in self._stats.items():
+            p50, p95 = st.latency_pct(0.5), st.latency_pct(0.95)
+            models[model] = {
+                "calls": st.calls,
+                "errors": st.errors,
+                "window_error_rate": round(st.error_rate(), 3),
+                "latency_p50_ms": round(p50, 1) if p50 is not None else None,
+                "latency_p95_ms": round(p95, 1) if p95 is not None else None,
+                "degraded": self.degraded(model),
+            }
+        decisions: dict[str, dict[str, dict[str, int]]] = {}
+        for (task, size, model), n in self._decisions.items():
+            decisions.setdefault(task, {}).setdefault(size, {})[model] = n
+        return {
+            "routes": self.routes,
+            "small_payload_chars": self.small_payload_chars,
+            "models": models,
+            "decisions": decisions,
+            "failovers": dict(self._failovers),
+        }
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import logging
+import math
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Optional
+
+from app.models.schemas import TokenUsage
+from app.storage.backends import StateBackend
+
+logger = logging.getLogger("xai.usage")
+
+_DAY_KEY_TTL_S = 2 * 24 * 3600  # shared day counters outlive their UTC day
+
+
+class BudgetExceeded(Exception):
+    """Daily LLM budget is spent; only cached results can be served until `retry_after_s`."""
+
+    def __init__(self, retry_after_s: int):
+        super().__init__(f"daily LLM budget exhausted, resets in {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+@dataclass
+class _Totals:
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    reasoning_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+
+    def add(self, other: _Totals) -> None:
+        self.calls += other.calls
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.reasoning_tokens += other.reasoning_tokens
+        self.cached_tokens += other.cached_tokens
+        self.cost_usd += other.cost_usd
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "reasoning_tokens": self.reasoning_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+@dataclass
+class RequestUsage:
+    endpoint: str
+    cache_only: bool = False
+    totals: _Totals = field(default_factory=_Totals)
+
+    def summary(self) -> TokenUsage:
+        t = self.totals
+        return TokenUsage(
+            llm_calls=t.calls,
+            input_tokens=t.input_tokens,
+            output_tokens=t.output_tokens,
+            reasoning_tokens=t.reasoning_tokens,
+            cached_tokens=t.cached_tokens,
+            cost_usd=round(t.cost_usd, 6),
+            cache_only=self.cache_only,
+        )
+
+
+_request: ContextVar[Optional[RequestUsage]] = ContextVar("llm_request_usage", default=None)
+
+
+class UsageMeter:
+    """
+    Token/cost accounting for xAI calls.
+
+      - totals per (stage, model, endpoint), plus per-request totals (request scope)
+      - adaptive max_output_tokens: rolling per-(stage, model) percentile of output tokens
+        times a safety margin, capped by the caller's default
+      - daily token/cost caps (UTC day): over the cap, LLM calls raise BudgetExceeded and
+        callers fall back to cached results. With a `state` backend the day's spend is an
+        atomic counter there, so the cap holds across workers (sqlite/redis); without one,
+        or with the memory backend, it is per process.
+    """
+
+    def __init__(
+        self,
+        *,
+        state: Optional[StateBackend] = None,
+        prices_per_mtok: Optional[dict[str, list[float]]] = None,
+        daily_token_budget: int = 0,
+        daily_cost_budget_usd: float = 0.0,
+        adaptive_output: bool = True,
+        window: int = 200,
+        min_samples: int = 20,
+        percentile: float = 0.95,
+        margin: float = 1.3,
+        min_output_tokens: int = 256,
+    ):
+        self.state = state
+        self.prices_per_mtok = prices_per_mtok or {}  # model -> [input $/1M tokens, output $/1M tokens]
+        self.daily_token_budget = daily_token_budget
+        self.daily_cost_budget_usd = daily_cost_budget_usd
+        self.adaptive_output = adaptive_output
+        self.window = window
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.margin = margin
+        self.min_output_tokens = min_output_tokens
+        self._totals: dict[tuple[str, str, str], _Totals] = {}
+        self._outputs: dict[tuple[str, str], deque[int]] = {}
+        self._day = self._today()
+        self._day_totals = _Totals()  # this process
+        self._day_spent = (0.0, 0.0)  # (tokens, cost_usd) for the day across workers sharing `state`
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).date().isoformat()
+
+    def _roll_day(self) -> None:
+        today = self._today()
+        if today != self._day:
+            self._day, self._day_totals, self._day_spent = today, _Totals(), (0.0, 0.0)
+
+    def _day_key(self, what: str) -> str:
+        return f"usage:{self._day}:{what}"
+
+    async def _spend(self, tokens: int, cost_usd: float) -> None:
+        if self.state is None:
+            day = self._day_totals
+            self._day_spent = (float(day.input_tokens + day.output_tokens), day.cost_usd)
+            return
+        self._day_spent = (
+            await self.state.incr(self._day_key("tokens"), tokens, ttl_s=_DAY_KEY_TTL_S),
+            await self.state.incr(self._day_key("cost_usd"), cost_usd, ttl_s=_DAY_KEY_TTL_S),
+        )
+
+    async def refresh_budget(self) -> None:
+        """Re-read the day's spend from the state backend (other workers' calls included)."""
+        self._roll_day()
+        if self.state is None:
+            return
+        tokens = await self.state.get(self._day_key("tokens"))
+        cost = await self.state.get(self._day_key("cost_usd"))
+        self._day_spent = (float(tokens or 0), float(cost or 0))
+
+    @asynccontextmanager
+    async def request(self, endpoint: str) -> AsyncIterator[RequestUsage]:
+        """Per-request scope: collects usage of every call made inside it and logs the totals."""
+        if self.daily_token_budget or self.daily_cost_budget_usd:
+            await self.refresh_budget()  # cache_only must reflect other workers' spend too
+        usage = RequestUsage(endpoint=endpoint, cache_only=self.budget_retry_after() is not None)
+        token = _request.set(usage)
+        try:
+            yield usage
+        finally:
+            _request.reset(token)
+            t = usage.totals
+            if t.calls:
+                logger.info(
+                    "usage endpoint=%s calls=%d input_tokens=%d output_tokens=%d reasoning_tokens=%d cost_usd=%.6f",
+                    endpoint, t.calls, t.input_tokens, t.output_tokens, t.reasoning_tokens, t.cost_usd,
+                )
+
+    def budget_retry_after(self) -> Optional[int]:
+        """Seconds until the daily budget resets if it is exhausted (last known spend), else None."""
+        self._roll_day()
+        tokens, cost_usd = self._day_spent
+        over_tokens = self.daily_token_budget and tokens >= self.daily_token_budget
+        over_cost = self.daily_cost_budget_usd and cost_usd >= self.daily_cost_budget_usd
+        if not (over_tokens or over_cost):
+            return None
+        now = datetime.now(timezone.utc)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        return max(1, int((midnight - now).total_seconds()))
+
+    async def check_budget(self) -> None:
+        if self.daily_token_budget or self.daily_cost_budget_usd:
+            await self.refresh_budget()
+        retry_after = self.budget_retry_after()
+        if retry_after is not None:
+            raise BudgetExceeded(retry_after)
+
+    def _learned_budget(self, stage: str, model: str) -> Optional[int]:
+        samples = self._outputs.get((stage, model))
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        p = ordered[min(int(self.percentile * len(ordered)), len(ordered) - 1)]
+        return max(self.min_output_tokens, math.ceil(p * self.margin))
+
+    def output_budget(self, stage: str, model: str, default: int) -> int:
+        """max_output_tokens for the next call: p{percentile} * margin of recent outputs, at most `default`."""
+        learned = self._learned_budget(stage, model) if self.adaptive_output else None
+        return default if learned is None else min(default, learned)
+
+    def reset_output_budget(self, stage: str, model: str) -> None:
+        """Forget the learned budget (a response was truncated); back to the default until re-learned."""
+        self._outputs.pop((stage, model), None)
+
+    @staticmethod
+    def truncated(resp: dict[str, Any]) -> bool:
+        details = resp.get("incomplete_details") or {}
+        return resp.get("status") == "incomplete" and details.get("reason") == "max_output_tokens"
+
+    async def record(self, stage: str, model: str, usage: Optional[dict[str, Any]]) -> None:
+        """Account the `usage` block of one response."""
+        usage = usage or {}
+        input_tokens = int(usage.get("input_tokens") or 0)
+        output_tokens = int(usage.get("output_tokens") or 0)
+        price_in, price_out = (self.prices_per_mtok.get(model) or [0.0, 0.0])[:2]
+        call = _Totals(
+            calls=1,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            reasoning_tokens=int((usage.get("output_tokens_details") or {}).get("reasoning_tokens") or 0),
+            cached_tokens=int((usage.get("input_tokens_details") or {}).get("cached_tokens") or 0),
+            cost_usd=(input_tokens * price_in + output_tokens * price_out) / 1_000_000,
+        )
+
+        req = _request.get()
+        endpoint = req.endpoint if req is not None else "-"
+        self._totals.setdefault((stage, model, endpoint), _Totals()).add(call)
+        if req is not None:
+            req.totals.add(call)
+        self._roll_day()
+        self._day_totals.add(call)
+        if output_tokens:
+            samples = self._outputs.get((stage, model))
+            if samples is None:
+                samples = self._outputs[(stage, model)] = deque(maxlen=self.window)
+            samples.append(output_tokens)
+        await self._spend(input_tokens + output_tokens, call.cost_usd)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "day": self._day,
+            "day_totals": self._day_totals.as_dict(),
+            "day_spent": {"tokens": int(self._day_spent[0]), "cost_usd": round(self._day_spent[1], 6)},
+            "daily_token_budget": self.daily_token_budget,
+            "daily_cost_budget_usd": self.daily_cost_budget_usd,
+            "totals": [
+                {"stage": stage, "model": model, "endpoint": endpoint, **t.as_dict()}
+                for (stage, model, endpoint), t in sorted(self._totals.items())
+            ],
+            "output_budgets": {
+                f"{stage}:{model}": {"samples": len(s), "learned_max_output_tokens": self._learned_budget(stage, model)}
+                for (stage, model), s in self._outputs.items()
+            },
+        }
@@ -0,0 +1,159 @@
+"""
+Per-request CPU time benchmark for the hot API paths.
+
+Runs the real FastAPI app in-process with the xAI client replaced by canned responses,
+so the numbers cover only our own work (validation, serialization, routing), not the network.
+
+Usage (from the repo root):
+    python scripts/bench_requests.py                 # current tree
+    python scripts/bench_requests.py --compare HEAD~1  # current tree vs. a git ref ("before")
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+PLAN = {
+    "robot_program": [
+        {"mode": "WHISK", "duration_sec": 30, "speed": 6, "attachment": "whisk"},
+        {"mode": "HEAT", "duration_sec": 480, "speed": 2, "temperature_c": 90},
+    ],
+    "manual_steps": ["Установите венчик.", "Добавьте яйца, молоко и соль."],
+    "warnings": [],
+    "questions": [],
+    "cannot_map": [],
+}
+LOCALIZED = {
+    "title": "Omelet in a bowl",
+    "ingredients": ["Eggs — 3 pcs", "Milk — 50 ml", "Salt"],
+    "steps": ["Whisk eggs with milk and salt for 30 seconds.", "Heat for 8 minutes at 90°C, stirring."],
+}
+
+
+def _measure(iterations: int) -> dict[str, list[float] | None]:
+    os.environ.setdefault("XAI_API_KEY", "bench")
+    sys.path.insert(0, os.getcwd())
+
+    from fastapi.testclient import TestClient
+
+    from app.api import routes
+    from app.main import app
+
+    recipe_text = Path("data/recipes/omelet_bowl.json").read_text(encoding="utf-8")
+    canned = {
+        "CanonicalRecipe": recipe_text,
+        "RobotPlan": json.dumps(PLAN, ensure_ascii=False),
+        "LocalizedRecipe": json.dumps(LOCALIZED, ensure_ascii=False),
+    }
+
+    async def fake_create_response(**kwargs):
+        name = kwargs["response_format"]["json_schema"]["name"]
+        return {"output": [{"type": "message", "content": [{"type": "output_text", "text": canned[name]}]}]}
+
+    routes.xai.create_response = fake_create_response
+
+    client = TestClient(app, raise_server_exceptions=False)
+    gen_body = {"query": "омлет", "lang": "ru", "robot_model": "AENO_XYZ"}
+    session_id = client.post("/v1/recipes/generate", json=gen_body).json()["session_id"]
+    query_n = itertools.count()
+
+    cases = {
+        "GET /v1/recipes/{id}?lang=ru": lambda: client.get("/v1/recipes/omelet_bowl?lang=ru"),
+        "GET /v1/recipes/{id}?lang=en": lambda: client.get("/v1/recipes/omelet_bowl?lang=en"),
+        # Distinct queries so every call runs the full (faked) pipeline instead of the result caches.
+        "POST /v1/recipes/generate": lambda: client.post(
+            "/v1/recipes/generate", json={**gen_body, "query": f"омлет {next(query_n)}"}
+        ),
+        "POST /v1/recipes/generate/continue": lambda: client.post(
+            "/v1/recipes/generate/continue", json={"session_id": session_id, "answers": {"servings": 4}}
+        ),
+    }
+    out: dict[str, list[float] | None] = {}
+    for name, call in cases.items():
+        if call().status_code != 200:  # path is broken in this tree; report n/a
+            out[name] = None
+            continue
+        for _ in range(max(iterations // 10, 5)):  # warmup
+            call()
+        samples: list[float] = []
+        for _ in range(iterations):
+            t0 = time.process_time_ns()
+            call()
+            samples.append((time.process_time_ns() - t0) / 1000.0)
+        out[name] = samples
+    return out
+
+
+def _run_tree(tree: Path, iterations: int) -> dict[str, list[float] | None]:
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--iterations", str(iterations), "--json"],
+        cwd=tree,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"benchmark failed in {tree}:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _export_ref(ref: str, dest: Path) -> None:
+    archive = subprocess.run(["git", "archive", ref], cwd=REPO_ROOT, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(dest)
+
+
+def _summary(samples: list[float]) -> tuple[float, float, float]:
+    qs = statistics.quantiles(samples, n=20)
+    return statistics.mean(samples), statistics.median(samples), qs[-1]
+
+
+def _print_table(results: dict[str, dict[str, list[float] | None]]) -> None:
+    labels = list(results)
+    endpoints = list(results[labels[-1]])
+    print(f"{'endpoint':38} " + " ".join(f"{lbl + ' mean/p50/p95 µs':>34}" for lbl in labels))
+    for ep in endpoints:
+        cells = []
+        for lbl in labels:
+            samples = results[lbl].get(ep)
+            if not samples:
+                cells.append("n/a")
+                continue
+            mean, p50, p95 = _summary(samples)
+            cells.append(f"{mean:>10.0f} {p50:>10.0f} {p95:>11.0f}")
+        print(f"{ep:38} " + " ".join(f"{c:>34}" for c in cells))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=300)
+    ap.add_argument("--compare", metavar="GIT_REF", help="also measure this ref as the 'before' baseline")
+    ap.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.json:
+        print(json.dumps(_measure(args.iterations)))
+        return
+
+    results: dict[str, dict[str, list[float] | None]] = {}
+    if args.compare:
+        with tempfile.TemporaryDirectory() as tmp:
+            _export_ref(args.compare, Path(tmp))
+            results[f"before({args.compare})"] = _run_tree(Path(tmp), args.iterations)
+    results["after"] = _run_tree(REPO_ROOT, args.iterations)
+    _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Cold-start benchmark: import time, warmup until /v1/ready, and first-request latency.
+
+Every run is a fresh interpreter (wall-clock ms). The xAI client is replaced by canned
+responses, so first-request numbers cover our own cold paths, not the network.
+
+Usage (from the repo root):
+    python scripts/bench_startup.py                  # current tree
+    python scripts/bench_startup.py --compare HEAD~1  # current tree vs. a git ref ("before")
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_requests import LOCALIZED, PLAN, REPO_ROOT, _export_ref, _summary
+
+METRICS = ["import app.main", "lifespan -> ready", "first GET /v1/recipes/{id}", "first POST /v1/recipes/generate"]
+
+
+def _measure_once() -> dict[str, float | None]:
+    os.environ.setdefault("XAI_API_KEY", "bench")
+    sys.path.insert(0, os.getcwd())
+    out: dict[str, float | None] = dict.fromkeys(METRICS)
+
+    t0 = time.perf_counter()
+    from app.main import app
+    out["import app.main"] = (time.perf_counter() - t0) * 1000.0
+
+    from fastapi.testclient import TestClient
+
+    from app.api import routes
+
+    canned = {
+        "CanonicalRecipe": Path("data/recipes/omelet_bowl.json").read_text(encoding="utf-8"),
+        "RobotPlan": json.dumps(PLAN, ensure_ascii=False),
+        "LocalizedRecipe": json.dumps(LOCALIZED, ensure_ascii=False),
+    }
+
+    async def fake_create_response(**kwargs):
+        name = kwargs["response_format"]["json_schema"]["name"]
+        return {"output": [{"type": "message", "content": [{"type": "output_text", "text": canned[name]}]}]}
+
+    routes.xai.create_response = fake_create_response
+
+    t0 = time.perf_counter()
+    with TestClient(app, raise_server_exceptions=False) as client:
+        if client.get("/v1/ready").status_code != 404:
+            while client.get("/v1/ready").status_code != 200:
+                time.sleep(0.001)
+            out["lifespan -> ready"] = (time.perf_counter() - t0) * 1000.0
+
+        t0 = time.perf_counter()
+        if client.get("/v1/recipes/omelet_bowl?lang=ru").status_code == 200:
+            out["first GET /v1/recipes/{id}"] = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        body = {"query": "омлет", "lang": "ru", "robot_model": "AENO_XYZ"}
+        if client.post("/v1/recipes/generate", json=body).status_code == 200:
+            out["first POST /v1/recipes/generate"] = (time.perf_counter() - t0) * 1000.0
+    return out
+
+
+def _run_tree(tree: Path, runs: int) -> dict[str, list[float] | None]:
+    samples: dict[str, list[float] | None] = {m: [] for m in METRICS}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--json"],
+            cwd=tree,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise SystemExit(f"benchmark failed in {tree}:\n{proc.stderr}")
+        for m, v in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+            if v is None:
+                samples[m] = None
+            elif samples[m] is not None:
+                samples[m].append(v)
+    return samples
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--compare", metavar="GIT_REF", help="also measure this ref as the 'before' baseline")
+    ap.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.json:
+        print(json.dumps(_measure_once()))
+        return
+
+    results: dict[str, dict[str, list[float] | None]] = {}
+    if args.compare:
+        with tempfile.TemporaryDirectory() as tmp:
+            _export_ref(args.compare, Path(tmp))
+            results[f"before({args.compare})"] = _run_tree(Path(tmp), args.runs)
+    results["after"] = _run_tree(REPO_ROOT, args.runs)
+
+    labels = list(results)
+    print(f"{'phase':34} " + " ".join(f"{lbl + ' mean/p50/p95 ms':>34}" for lbl in labels))
+    for m in METRICS:
+        cells = []
+        for lbl in labels:
+            samples = results[lbl][m]
+            if not samples or len(samples) < 2:
+                cells.append("n/a")
+                continue
+            mean, p50, p95 = _summary(samples)
+            cells.append(f"{mean:>10.1f} {p50:>10.1f} {p95:>11.1f}")
+        print(f"{m:34} " + " ".join(f"{c:>34}" for c in cells))
+
+
+if __name__ == "__main__":
+    main()